@@ -0,0 +1,132 @@
+import argparse
+import http.client
+import random
+import threading
+import time
+from multiprocessing import Pool
+from urllib.parse import urlsplit
+
+# Mix of request targets roughly matching how internal tools use the API
+REQUEST_MIX = [
+    '/sponsors?limit=50',
+    '/sponsors?q=ltd&limit=50',
+    '/sponsors?city=London&limit=100',
+    '/sponsors?route=Skilled+Worker&limit=100',
+    '/stats',
+    '/changes',
+    '/version',
+]
+
+def _client_thread(host, port, deadline, revalidate, results):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    etags = {}
+    latencies = []
+    statuses = {}
+    rng = random.Random()
+
+    while time.perf_counter() < deadline:
+        target = rng.choice(REQUEST_MIX)
+        headers = {'Accept-Encoding': 'gzip'}
+        if revalidate and target in etags:
+            headers['If-None-Match'] = etags[target]
+
+        start = time.perf_counter()
+        try:
+            conn.request('GET', target, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            statuses['error'] = statuses.get('error', 0) + 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        etag = response.getheader('ETag')
+        if etag:
+            etags[target] = etag
+
+    conn.close()
+    results.append((latencies, statuses))
+
+def _client_process(args):
+    host, port, threads, duration, revalidate = args
+    deadline = time.perf_counter() + duration
+    results = []
+    workers = [
+        threading.Thread(target=_client_thread, args=(host, port, deadline, revalidate, results))
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    latencies = []
+    statuses = {}
+    for thread_latencies, thread_statuses in results:
+        latencies.extend(thread_latencies)
+        for status, count in thread_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return latencies, statuses
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_load_test(url, processes=4, threads=8, duration=10, revalidate=True):
+    """Drive the API with concurrent keep-alive clients and return a summary."""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+
+    jobs = [(host, port, threads, duration, revalidate)] * processes
+    with Pool(processes) as pool:
+        outputs = pool.map(_client_process, jobs)
+
+    latencies = []
+    statuses = {}
+    for process_latencies, process_statuses in outputs:
+        latencies.extend(process_latencies)
+        for status, count in process_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    latencies.sort()
+
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'statuses': statuses,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-client load test for sponsor_api.py.")
+    parser.add_argument('--url', help="API base URL; starts a local server when omitted")
+    parser.add_argument('--processes', type=int, default=4, help="Client processes")
+    parser.add_argument('--threads', type=int, default=8, help="Keep-alive connections per process")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds to run")
+    parser.add_argument('--no-revalidate', action='store_true', help="Never send If-None-Match")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        from sponsor_api import create_server
+        server = create_server(port=0, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"Load testing {url} with {args.processes}x{args.threads} clients for {args.duration}s...")
+    summary = run_load_test(url, args.processes, args.threads, args.duration, not args.no_revalidate)
+
+    print(f"Requests: {summary['requests']:,}")
+    print(f"Throughput: {summary['requests_per_second']:,.0f} req/s")
+    print(f"Latency p50/p95/p99: {summary['p50_ms']:.2f} / {summary['p95_ms']:.2f} / {summary['p99_ms']:.2f} ms")
+    print(f"Status codes: {summary['statuses']}")
+
+    if server:
+        server.shutdown()
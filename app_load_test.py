@@ -0,0 +1,225 @@
+import argparse
+import importlib
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Pool
+
+from api_load_test import percentile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+CITIES = [
+    'London', 'Manchester', 'Birmingham', 'Leeds', 'Glasgow', 'Bristol', 'Cardiff', 'Edinburgh',
+    'Liverpool', 'Sheffield', 'Nottingham', 'Leicester', 'Coventry', 'Belfast', 'Reading',
+    'Cambridge', 'Oxford', 'Milton Keynes', 'Southampton', 'Brighton', 'St. Albans', 'london',
+]
+COUNTIES = ['', 'Greater London', 'West Midlands', 'Kent', 'Surrey', 'Lancashire', 'Yorkshire']
+TYPE_RATINGS = [
+    'Worker (A rating)', 'Worker (A (SME+))', 'Worker (A (Premium))', 'Worker (B rating)',
+    'Worker (Provisional)', 'Temporary Worker (A rating)',
+]
+NAME_WORDS = ['Care', 'Tech', 'Consulting', 'Health', 'Logistics', 'Foods', 'Digital', 'Group', 'Services']
+SEARCH_TERMS = ['', 'ltd', 'care', 'tech', '12', 'group']
+
+def build_synthetic_database(directory, rows=100_000, days=120, removed_share=0.05, seed=0):
+    """Write a register of `rows` licences spread over `days` daily runs.
+
+    The database is created at the usual relative path under directory, with
+    its derived tables built from the register, so the pages can run against
+    it unchanged.
+    """
+    import numpy as np
+    import pandas as pd
+    from db_utils import DB_PATH, setup_database
+    from sponsor_codes import update_register_codes
+    from sponsor_validation import KNOWN_ROUTES
+    from sponsor_cube import rebuild_sponsor_cube
+    from sponsor_lifetimes import rebuild_licence_removals
+    from sponsor_profiles import rebuild_organisation_profiles
+
+    rng = np.random.default_rng(seed)
+    run_dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=days).strftime('%Y-%m-%d').to_numpy()
+
+    # Most licences come from the first load, the rest appear day by day
+    first_run = np.where(rng.random(rows) < 0.6, 0, rng.integers(0, days, rows))
+    last_run = np.full(rows, days - 1)
+    removed = (rng.random(rows) < removed_share) & (first_run < days - 1)
+    last_run[removed] = rng.integers(first_run[removed], days - 1)
+
+    register = pd.DataFrame({
+        'organisation_name': [f"{NAME_WORDS[i % len(NAME_WORDS)]} {i} Ltd" for i in range(rows)],
+        'town_city': rng.choice(CITIES, rows),
+        'county': rng.choice(COUNTIES, rows),
+        'type_rating': rng.choice(TYPE_RATINGS, rows),
+        'route': rng.choice(sorted(KNOWN_ROUTES), rows),
+        'first_appeared_date': run_dates[first_run],
+        'last_updated_date': run_dates[last_run],
+    })
+    removal_run = np.minimum(last_run + 1, days - 1)
+    daily = pd.DataFrame({
+        'date': run_dates,
+        'added_count': np.bincount(first_run, minlength=days),
+        'removed_count': np.bincount(removal_run[removed], minlength=days),
+    })
+
+    db_path = os.path.join(directory, DB_PATH)
+    conn = setup_database(db_path)
+    conn.executemany(
+        f"INSERT INTO sponsor_register ({', '.join(register.columns)}) VALUES ({', '.join('?' * len(register.columns))})",
+        register.itertuples(index=False, name=None)
+    )
+    conn.executemany(
+        "INSERT INTO daily_updates (date, added_count, removed_count) VALUES (?, ?, ?)",
+        [(date, int(added), int(removed_count)) for date, added, removed_count in daily.itertuples(index=False, name=None)]
+    )
+    update_register_codes(conn)
+    rebuild_sponsor_cube(conn)
+    rebuild_licence_removals(conn)
+    rebuild_organisation_profiles(conn)
+    conn.commit()
+    conn.close()
+    return db_path
+
+def _pick(widget, rng, most=2):
+    """Choose up to `most` options of a multiselect."""
+    options = list(widget.options)
+    return rng.sample(options, k=min(len(options), rng.randint(0, most)))
+
+# Scripted interactions per page. Each changes one widget; the rerun that
+# follows is what gets timed.
+DASHBOARD_INTERACTIONS = {
+    'days slider': lambda at, rng: at.slider[0].set_value(rng.randint(1, 90)),
+    'city filter': lambda at, rng: at.multiselect(key='city_filter').set_value(_pick(at.multiselect(key='city_filter'), rng)),
+    'route filter': lambda at, rng: at.multiselect(key='route_filter').set_value(_pick(at.multiselect(key='route_filter'), rng)),
+    'time period': lambda at, rng: at.radio[0].set_value(rng.choice(['Daily', 'Weekly', 'Monthly'])),
+}
+
+LIST_INTERACTIONS = {
+    'search': lambda at, rng: at.text_input[0].input(rng.choice(SEARCH_TERMS)),
+    'city filter': lambda at, rng: at.multiselect[0].set_value(_pick(at.multiselect[0], rng)),
+    'route filter': lambda at, rng: at.multiselect[1].set_value(_pick(at.multiselect[1], rng)),
+    'worker type filter': lambda at, rng: at.multiselect[2].set_value(_pick(at.multiselect[2], rng)),
+    'rating filter': lambda at, rng: at.multiselect[3].set_value(_pick(at.multiselect[3], rng)),
+}
+
+PAGES = {
+    'dashboard': ('pages/sponsor_dashboard.py', DASHBOARD_INTERACTIONS),
+    'list': ('pages/sponsor_list.py', LIST_INTERACTIONS),
+}
+
+def resident_memory_mb():
+    """Current resident memory of this process, falling back to the peak."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+def _session(page, reruns, seed, timeout, results):
+    from streamlit.testing.v1 import AppTest
+
+    path, interactions = PAGES[page]
+    rng = random.Random(seed)
+    app = AppTest.from_file(os.path.join(ROOT, path), default_timeout=timeout)
+    latencies = []
+    errors = 0
+
+    for step in range(reruns + 1):
+        if step:
+            interactions[rng.choice(list(interactions))](app, rng)
+        start = time.perf_counter()
+        app.run()
+        latencies.append(time.perf_counter() - start)
+        errors += len(app.exception)
+
+    # The finished session is returned too, so it stays alive while memory is measured
+    results.append((latencies, errors, app))
+
+def _session_process(args):
+    directory, page, sessions, reruns, seed, timeout = args
+    os.chdir(directory)
+    sys.path.insert(0, ROOT)
+
+    # Load Streamlit and the page's modules first so per-session memory
+    # excludes what every process pays once
+    importlib.import_module('streamlit.testing.v1')
+    importlib.import_module('sponsor_analytics')
+    baseline_mb = resident_memory_mb()
+
+    results = []
+    workers = [
+        threading.Thread(target=_session, args=(page, reruns, seed + number, timeout, results))
+        for number in range(sessions)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    memory_mb = resident_memory_mb()
+    latencies = [latency for session_latencies, _, _ in results for latency in session_latencies]
+    errors = sum(session_errors for _, session_errors, _ in results)
+    return latencies, errors, (memory_mb - baseline_mb) / max(len(results), 1), memory_mb
+
+def run_load_test(directory, page, processes=2, sessions=4, reruns=10, seed=0, timeout=120):
+    """Drive a page with simulated sessions and return a summary.
+
+    Each of `processes` processes runs `sessions` concurrent sessions, like
+    one Streamlit server, and each session makes `reruns` scripted widget
+    changes after its first run.
+    """
+    jobs = [(directory, page, sessions, reruns, seed + 1000 * number, timeout) for number in range(processes)]
+    with Pool(processes) as pool:
+        outputs = pool.map(_session_process, jobs)
+
+    latencies = sorted(latency for process_latencies, _, _, _ in outputs for latency in process_latencies)
+    return {
+        'page': page,
+        'reruns': len(latencies),
+        'errors': sum(errors for _, errors, _, _ in outputs),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'session_mb': sum(session_mb for _, _, session_mb, _ in outputs) / len(outputs),
+        'process_mb': max(process_mb for _, _, _, process_mb in outputs),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless load test for the Streamlit pages.")
+    parser.add_argument('--pages', nargs='+', choices=sorted(PAGES), default=sorted(PAGES), help="Pages to drive")
+    parser.add_argument('--processes', type=int, default=2, help="Server processes")
+    parser.add_argument('--sessions', type=int, default=4, help="Concurrent sessions per process")
+    parser.add_argument('--reruns', type=int, default=10, help="Widget interactions per session")
+    parser.add_argument('--rows', type=int, default=100_000, help="Licences in the synthetic register")
+    parser.add_argument('--days', type=int, default=120, help="Daily runs in the synthetic register")
+    parser.add_argument('--data-dir', help="Reuse a directory from an earlier --keep run")
+    parser.add_argument('--keep', action='store_true', help="Keep the synthetic database afterwards")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    directory = args.data_dir or tempfile.mkdtemp(prefix='sponsor_load_')
+    if not args.data_dir:
+        print(f"Building a synthetic register of {args.rows:,} licences in {directory}...")
+        build_synthetic_database(directory, args.rows, args.days, seed=args.seed)
+
+    try:
+        for page in args.pages:
+            print(f"Driving {page} with {args.processes}x{args.sessions} sessions, {args.reruns} reruns each...")
+            summary = run_load_test(directory, page, args.processes, args.sessions, args.reruns, args.seed)
+            print(f"  Reruns: {summary['reruns']:,} ({summary['errors']} with exceptions)")
+            print(f"  Latency p50/p95/p99/max: {summary['p50_ms']:.0f} / {summary['p95_ms']:.0f} / "
+                  f"{summary['p99_ms']:.0f} / {summary['max_ms']:.0f} ms")
+            print(f"  Memory: {summary['session_mb']:.1f} MB per session, {summary['process_mb']:.0f} MB per process")
+    finally:
+        if args.keep or args.data_dir:
+            print(f"Synthetic data kept in {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -1,31 +1,81 @@
+import argparse
 import os
 import sys
 from datetime import datetime
+from pipeline_checkpoints import get_checkpoints, get_sidecar_checkpoint, save_checkpoint, save_sidecar_checkpoint
 
-# Import your modules
-from fetch_sponsor_data import download_sponsor_register
-from process_sponsor_data import process_daily_update
+def as_of_date(value):
+    """Parse a YYYY-MM-DD command line date."""
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
 
-def run_daily_pipeline():
-    """Run the complete daily pipeline."""
-    print(f"=== Starting daily pipeline: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
+def run_daily_pipeline(publish=False, dry_run=False, as_of=None, workers=None):
+    """Run the complete daily pipeline.
+
+    With publish=True the database is rebuilt as a separate file and swapped
+    in atomically instead of being updated in place. With dry_run=True the
+    changes are only written to a report and the database is left untouched.
+
+    The run is recorded under as_of, today by default. Rerunning the same
+    date reuses the downloaded file and resumes after the last completed
+    stage instead of starting again.
+
+    workers sets how many processes clean a large CSV; it is cleaned in
+    this process by default.
+    """
+    as_of = as_of or datetime.now().strftime('%Y-%m-%d')
+    print(f"=== Starting daily pipeline for {as_of}: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
 
     try:
-        # Step 1: Download the latest data
-        print("Step 1: Downloading latest sponsor data...")
-        csv_file = download_sponsor_register()
-        if not csv_file:
-            print("Failed to download data. Exiting pipeline.")
-            return False
+        # Import your modules here rather than at module load: they pull in
+        # pandas, requests and BeautifulSoup, which dominate startup time
+        from fetch_sponsor_data import download_sponsor_register
+
+        # Step 1: Download the latest data, unless this date already has it
+        downloaded = get_checkpoints(as_of).get('download') or get_sidecar_checkpoint(as_of, 'download')
+        if downloaded and os.path.exists(downloaded['csv_file']):
+            csv_file = downloaded['csv_file']
+            print(f"Step 1: Using {csv_file} downloaded by an earlier run")
+        else:
+            print("Step 1: Downloading latest sponsor data...")
+            csv_file = download_sponsor_register(as_of)
+            if not csv_file:
+                print("Failed to download data. Exiting pipeline.")
+                return False
+            # A publish run never writes the live database in place
+            if publish:
+                save_sidecar_checkpoint(as_of, 'download', {'csv_file': csv_file})
+            elif not dry_run:
+                save_checkpoint(as_of, 'download', {'csv_file': csv_file})
+
+        if dry_run:
+            from process_sponsor_data import preview_daily_update
 
-        # Step 2: Process the data and update the database
-        print("Step 2: Processing data and updating database...")
-        results = process_daily_update(csv_file)
+            # Step 2: Compute the changes and report them without writing
+            print("Step 2: Computing changes (dry run)...")
+            results = preview_daily_update(csv_file, as_of=as_of, workers=workers)
+        elif publish:
+            from publish_database import publish_daily_update
+
+            # Step 2: Process, evaluate alerts and publish a new database file
+            print("Step 2: Processing data and publishing database...")
+            results = publish_daily_update(csv_file, as_of=as_of, workers=workers)
+        else:
+            from process_sponsor_data import process_daily_update
+            from sponsor_alerts import evaluate_alerts
+
+            # Step 2: Process the data and update the database
+            print("Step 2: Processing data and updating database...")
+            results = process_daily_update(csv_file, as_of=as_of, workers=workers)
+
+            # Step 3: Match the day's changes against saved searches
+            print("Step 3: Evaluating saved-search alerts...")
+            evaluate_alerts(results['delta'], results['date'])
 
         print(f"Pipeline completed successfully.")
         print(f"Date: {results['date']}")
         print(f"New sponsors: {results['new_entries']}")
         print(f"Removed sponsors: {results['removed_entries']}")
+        print(f"Changed sponsors: {results['changed_entries']}")
 
         return True
 
@@ -34,5 +84,16 @@ def run_daily_pipeline():
         return False
 
 if __name__ == "__main__":
-    success = run_daily_pipeline()
+    parser = argparse.ArgumentParser(description="Run the daily sponsor register pipeline.")
+    parser.add_argument('--publish', action='store_true',
+                        help="Build the database as a new file and swap it in atomically")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Write a change report without modifying the database")
+    parser.add_argument('--as-of', type=as_of_date, metavar='YYYY-MM-DD',
+                        help="Date to record the update under (default: today)")
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help="Clean the CSV across N processes (default: clean serially)")
+    args = parser.parse_args()
+
+    success = run_daily_pipeline(publish=args.publish, dry_run=args.dry_run, as_of=args.as_of, workers=args.workers)
     sys.exit(0 if success else 1)
\ No newline at end of file
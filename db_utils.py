@@ -1,9 +1,18 @@
 import sqlite3
 import os
 
-def setup_database():
-    os.makedirs('data/db', exist_ok=True)
-    conn = sqlite3.connect('data/db/sponsor_register.db')
+DB_PATH = 'data/db/sponsor_register.db'
+
+# Saved searches and the alert outbox are written by users and the mailer
+# at any time, so they live outside the register database, which a publish
+# run replaces wholesale. They hold subscriber email addresses, so the file
+# is never committed: CI keeps it in private storage and points
+# SPONSOR_ALERTS_DB at its local copy.
+ALERTS_DB_PATH = os.environ.get('SPONSOR_ALERTS_DB', 'data/db/alerts.db')
+
+def setup_database(db_path=DB_PATH):
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     # Create a table for the sponsor register
@@ -16,10 +25,27 @@ def setup_database():
                    route TEXT,
                    first_appeared_date DATE,
                    last_updated_date DATE,
+                   route_code INTEGER,
+                   city_code INTEGER,
+                   worker_type_code INTEGER,
+                   rating_code INTEGER,
                    PRIMARY KEY (organisation_name, route)
                    )
     ''')
 
+    # Databases from before the code columns were added get them appended,
+    # which keeps the same column order as a new table
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(sponsor_register)")}
+    for column in ('route_code', 'city_code', 'worker_type_code', 'rating_code'):
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE sponsor_register ADD COLUMN {column} INTEGER")
+
+    # Index for newest-first listings and keyset pagination
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_sponsor_register_first_appeared
+    ON sponsor_register(first_appeared_date DESC, organisation_name, route)
+    ''')
+
     # Create daily update table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS daily_updates(
@@ -28,6 +54,146 @@ def setup_database():
                    removed_count INTEGER
                    )
 ''')
-    
+
+    # Rows from the daily CSV that failed validation, with the reasons
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS quarantine(
+                   date DATE,
+                   organisation_name TEXT,
+                   town_city TEXT,
+                   county TEXT,
+                   type_rating TEXT,
+                   route TEXT,
+                   reason TEXT
+                   )
+    ''')
+
+    # One row per organisation, kept up to date from each daily delta
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS organisation_profiles(
+                   organisation_name TEXT PRIMARY KEY,
+                   town_city TEXT,
+                   county TEXT,
+                   first_seen_date DATE,
+                   current_routes TEXT,
+                   removed_date DATE
+                   ) WITHOUT ROWID
+    ''')
+
+    # Licence additions, removals and rating changes per organisation
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS organisation_events(
+                   organisation_name TEXT,
+                   date DATE,
+                   route TEXT,
+                   event TEXT,
+                   type_rating TEXT,
+                   previous_type_rating TEXT,
+                   PRIMARY KEY (organisation_name, date, route, event)
+                   ) WITHOUT ROWID
+    ''')
+
+    # Current licence counts by first-appeared date, canonical city and route,
+    # maintained by the pipeline for dashboard filter combinations
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sponsor_cube(
+                   first_appeared_date DATE,
+                   town_city TEXT,
+                   route TEXT,
+                   sponsor_count INTEGER,
+                   PRIMARY KEY (first_appeared_date, town_city, route)
+                   ) WITHOUT ROWID
+    ''')
+
+    # Removed licences by month first seen, month removed, route and
+    # canonical city, for lifetime and churn analytics
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS licence_removals(
+                   first_month TEXT,
+                   removed_month TEXT,
+                   route TEXT,
+                   town_city TEXT,
+                   licence_count INTEGER,
+                   PRIMARY KEY (first_month, removed_month, route, town_city)
+                   ) WITHOUT ROWID
+    ''')
+
+    # Labels of the integer codes on sponsor_register, by dimension
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS register_codes(
+                   dimension TEXT,
+                   code INTEGER,
+                   value TEXT,
+                   PRIMARY KEY (dimension, code)
+                   ) WITHOUT ROWID
+    ''')
+
+    # Completed stages of each daily run, keyed by the run's as-of date
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pipeline_checkpoints(
+                   run_date DATE,
+                   stage TEXT,
+                   detail TEXT,
+                   completed_at TEXT,
+                   PRIMARY KEY (run_date, stage)
+                   )
+    ''')
+
+    conn.commit()
+    return conn
+
+def setup_alerts_database(db_path=ALERTS_DB_PATH, register_path=DB_PATH):
+    """Open the alerts database, creating its tables if needed.
+
+    When the file is first created, saved searches and alerts kept in the
+    register database by earlier versions are copied across.
+    """
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    is_new = not os.path.exists(db_path)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Saved searches for alerts; list criteria are stored as JSON arrays
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS saved_searches(
+                   search_id INTEGER PRIMARY KEY,
+                   email TEXT NOT NULL,
+                   cities TEXT,
+                   routes TEXT,
+                   ratings TEXT,
+                   keywords TEXT,
+                   change_types TEXT,
+                   created_date DATE
+                   )
+    ''')
+
+    # Alerts waiting to be picked up by a mailer
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS alert_outbox(
+                   alert_id INTEGER PRIMARY KEY,
+                   search_id INTEGER,
+                   email TEXT,
+                   date DATE,
+                   change_type TEXT,
+                   organisation_name TEXT,
+                   town_city TEXT,
+                   type_rating TEXT,
+                   route TEXT,
+                   sent_date DATE,
+                   UNIQUE (search_id, date, change_type, organisation_name, route)
+                   )
+    ''')
+
+    if is_new and os.path.exists(register_path):
+        cursor.execute("ATTACH DATABASE ? AS register", (register_path,))
+        legacy = {name for (name,) in cursor.execute(
+            "SELECT name FROM register.sqlite_master WHERE type = 'table'"
+        )}
+        for table in ('saved_searches', 'alert_outbox'):
+            if table in legacy:
+                cursor.execute(f"INSERT INTO main.{table} SELECT * FROM register.{table}")
+        conn.commit()
+        cursor.execute("DETACH DATABASE register")
+
     conn.commit()
-    return conn
\ No newline at end of file
+    return conn
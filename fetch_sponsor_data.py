@@ -1,10 +1,13 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import os
 from datetime import datetime
 
-def download_sponsor_register():
+def download_sponsor_register(as_of=None):
+    """Download the current register to data/raw, named for the as-of date (today by default)."""
+    # requests and BeautifulSoup are slow to import, so load them only when downloading
+    import requests
+    from bs4 import BeautifulSoup
+
     # Get the main page
     main_url = "https://www.gov.uk/government/publications/register-of-licensed-sponsors-workers"
     response = requests.get(main_url)
@@ -26,7 +29,7 @@ def download_sponsor_register():
     response = requests.get(csv_url)
     if response.status_code != 200:
         raise Exception(f"Failed to download CSV file: {response.status_code}")
-    today = datetime.now().strftime('%Y-%m-%d')
+    today = as_of or datetime.now().strftime('%Y-%m-%d')
     filename = f"data/raw/sponsor_register_{today}.csv"
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
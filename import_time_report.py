@@ -0,0 +1,113 @@
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Startup budget per entry point: the most time its module-level imports may
+# take, and heavy modules that must not be loaded until a code path needs them.
+# The pages load pandas through sponsor_analytics, which their first output
+# already needs, so only plotting is deferred there.
+ENTRY_POINTS = {
+    'daily_pipeline.py': {
+        'budget_ms': 150,
+        'forbidden': ['pandas', 'numpy', 'requests', 'bs4'],
+    },
+    'app.py': {
+        'budget_ms': 1500,
+        'forbidden': ['pandas', 'numpy', 'plotly.express'],
+    },
+    'pages/sponsor_dashboard.py': {
+        'budget_ms': 2500,
+        'forbidden': ['plotly.express'],
+    },
+    'pages/sponsor_list.py': {
+        'budget_ms': 2500,
+        'forbidden': ['plotly.express'],
+    },
+    'sponsor_api.py': {
+        'budget_ms': 1500,
+        'forbidden': ['streamlit', 'plotly.express', 'requests', 'bs4'],
+    },
+}
+
+def module_level_imports(path):
+    """Return the source of the import block at the top of an entry point.
+
+    This is what runs before the entry point can do or render anything.
+    Imports placed later in a page script, after its first output, are
+    deliberately left out.
+    """
+    with open(os.path.join(ROOT, path)) as file:
+        tree = ast.parse(file.read(), filename=path)
+    imports = []
+    for node in tree.body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            break
+        imports.append(node)
+    return '\n'.join(ast.unparse(node) for node in imports) or 'pass'
+
+def measure_imports(path):
+    """Import an entry point's module-level imports in a fresh interpreter.
+
+    Returns (total_ms, {module: cumulative_ms}) from `python -X importtime`.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', module_level_imports(path)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Importing {path} failed:\n{result.stderr}")
+
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        modules[name.strip()] = int(cumulative_us) / 1000
+    return total_us / 1000, modules
+
+def build_report(entry_points=ENTRY_POINTS):
+    """Measure every entry point against its budget."""
+    report = []
+    for path, budget in entry_points.items():
+        total_ms, modules = measure_imports(path)
+        loaded = [name for name in budget['forbidden']
+                  if any(module == name or module.startswith(name + '.') for module in modules)]
+        slowest = sorted(
+            ((ms, name) for name, ms in modules.items() if '.' not in name),
+            reverse=True
+        )[:5]
+        report.append({
+            'entry_point': path,
+            'total_ms': total_ms,
+            'budget_ms': budget['budget_ms'],
+            'forbidden_loaded': loaded,
+            'slowest': slowest,
+        })
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report import time for each entry point.")
+    parser.add_argument('--check', action='store_true',
+                        help="Exit non-zero if a budget is exceeded or a deferred module is loaded early")
+    args = parser.parse_args()
+
+    failures = 0
+    for entry in build_report():
+        over_budget = entry['total_ms'] > entry['budget_ms']
+        status = 'FAIL' if over_budget or entry['forbidden_loaded'] else 'ok'
+        print(f"[{status}] {entry['entry_point']}: {entry['total_ms']:.0f} ms (budget {entry['budget_ms']} ms)")
+        for ms, name in entry['slowest']:
+            print(f"        {ms:8.1f} ms  {name}")
+        if entry['forbidden_loaded']:
+            print(f"        loaded at startup: {', '.join(entry['forbidden_loaded'])}")
+        if status == 'FAIL':
+            failures += 1
+
+    if args.check and failures:
+        sys.exit(1)
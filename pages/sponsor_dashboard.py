@@ -1,14 +1,9 @@
-import streamlit as st
 import pandas as pd
-import plotly.express as px
+import streamlit as st
 from datetime import datetime, timedelta
-from sponsor_analytics import get_recent_sponsors, get_sponsor_stats, get_daily_additions
-
-st.set_page_config(
-    page_title="UK Sponsor License Tracker",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="collapsed"
+from sponsor_analytics import (
+    get_cube_stats, query_sponsor_cube,
+    get_licence_survival, get_median_lifetimes, get_monthly_churn
 )
 
 # Modern CSS with contemporary design elements
@@ -100,10 +95,12 @@ st.write("Track companies with UK sponsor licenses for work visas")
 st.markdown('<div class="filter-container">', unsafe_allow_html=True)
 st.markdown('<div class="filter-header">🔍 Filters & Options</div>', unsafe_allow_html=True)
 
-# Get initial data for filter options
-initial_sponsors = get_recent_sponsors(days=90)
-available_cities = sorted(initial_sponsors['town_city'].unique().tolist())
-available_routes = sorted(initial_sponsors['route'].unique().tolist())
+# Get filter options from the cube rather than raw rows
+options_cutoff = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+available_cities = sorted(
+    city for city in query_sponsor_cube(since=options_cutoff, group_by=['town_city'])['town_city'] if city
+)
+available_routes = sorted(query_sponsor_cube(since=options_cutoff, group_by=['route'])['route'])
 
 # Create responsive filter layout
 filter_col1, filter_col2, filter_col3 = st.columns([1, 1, 1])
@@ -133,25 +130,9 @@ with options_col1:
 
 st.markdown('</div>', unsafe_allow_html=True)
 
-# ===== GET FILTERED DATA =====
-recent_sponsors = get_recent_sponsors(days=days_filter)
-
-# Apply filters
-filtered_sponsors = recent_sponsors
-if route_filter:
-    filtered_sponsors = filtered_sponsors[filtered_sponsors['route'].isin(route_filter)]
-if city_filter:
-    filtered_sponsors = filtered_sponsors[filtered_sponsors['town_city'].isin(city_filter)]
-
 # ===== STATS SECTION =====
-stats = get_sponsor_stats()
-
-# Update stats based on filters
-if city_filter or route_filter:
-    stats['total_sponsors'] = len(filtered_sponsors)
-    stats['recent_additions_7d'] = len(filtered_sponsors[
-        filtered_sponsors['first_appeared_date'] >= (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-    ])
+# Filtered and unfiltered figures both come from the pre-aggregated cube
+stats = get_cube_stats(cities=city_filter, routes=route_filter, days=days_filter)
 
 # Metrics Cards Row
 cols = st.columns(3, gap="medium")
@@ -163,20 +144,25 @@ with cols[2]:
     st.metric("Updated", datetime.now().strftime("%Y-%m-%d"), help="Data last refreshed on this date")
 
 # ===== CHARTS SECTION =====
+# plotly.express is imported only now, after the metrics have been sent, so
+# the first paint does not wait for it
+import plotly.express as px
 
-# Daily additions chart
-daily_additions = get_daily_additions()
+# Daily additions chart: current licences by the date they first appeared,
+# with or without filters
+cutoff_date = (datetime.now() - timedelta(days=days_filter)).strftime("%Y-%m-%d")
+daily_additions = query_sponsor_cube(
+    city_filter, route_filter, since=cutoff_date, group_by=['first_appeared_date']
+).rename(columns={'first_appeared_date': 'date', 'count': 'added_count'}).sort_values('date')
 
 if not daily_additions.empty:
-    cutoff_date = (datetime.now() - timedelta(days=days_filter)).strftime("%Y-%m-%d")
-    daily_additions = daily_additions[daily_additions['date'] >= cutoff_date]
     daily_additions['date'] = pd.to_datetime(daily_additions['date'])
 
     if time_period == "Weekly":
         chart_data = daily_additions.resample('W', on='date').sum().reset_index()
         title = "Weekly New Sponsors"
     elif time_period == "Monthly":
-        chart_data = daily_additions.resample('M', on='date').sum().reset_index()
+        chart_data = daily_additions.resample('MS', on='date').sum().reset_index()
         title = "Monthly New Sponsors"
     else:
         chart_data = daily_additions
@@ -197,13 +183,11 @@ if not daily_additions.empty:
         xaxis=dict(tickformat="%d %b", dtick=5 * 86400000, showgrid=True, gridcolor="rgba(128,128,128,0.1)"),
         yaxis=dict(showgrid=True, gridcolor="rgba(128,128,128,0.1)", title="Number of Companies")
     )
-    st.plotly_chart(fig1, use_container_width=True)
+    st.plotly_chart(fig1, width="stretch")
 
 # Top Cities Treemap
-if not recent_sponsors.empty:
-    recent_top_cities = recent_sponsors['town_city'].value_counts().reset_index()
-    recent_top_cities.columns = ['town_city', 'count']
-    recent_top_cities = recent_top_cities.head(10)
+recent_top_cities = pd.DataFrame(stats['top_cities'], columns=['town_city', 'count'])
+if not recent_top_cities.empty:
 
     fig2 = px.treemap(
         recent_top_cities, path=['town_city'], values='count',
@@ -224,7 +208,71 @@ if not recent_sponsors.empty:
         margin=dict(t=80, l=10, r=10, b=10)
     )
     fig2.update_traces(textinfo="label+value", hovertemplate="<b>%{label}</b><br>New Sponsors: %{value}<extra></extra>")
-    st.plotly_chart(fig2, use_container_width=True)
+    st.plotly_chart(fig2, width="stretch")
+
+# ===== LICENCE LIFETIME SECTION =====
+# Survival, churn and medians are computed from monthly licence counts in
+# sponsor_cube and licence_removals, not from register rows
+st.header("Licence Lifetime & Churn")
+survival = get_licence_survival(cities=city_filter, routes=route_filter)
+
+if survival.empty or not (survival['survival'] < 1).any():
+    st.info("No licence removals recorded yet for the selected filters.")
+else:
+    plot_template = "plotly" if st.get_option("theme.base") == "light" else "plotly_dark"
+    life_col1, life_col2 = st.columns(2, gap="medium")
+
+    with life_col1:
+        fig3 = px.line(
+            survival, x='months', y='survival', title="Licence Survival",
+            template=plot_template, line_shape="hv",
+            labels={"months": "Months Since First Seen", "survival": "Share Still Licensed"}
+        )
+        fig3.update_traces(line_color='#667eea')
+        fig3.update_layout(
+            plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+            title_x=0.5, yaxis=dict(tickformat=".0%", range=[0, 1.05])
+        )
+        st.plotly_chart(fig3, width="stretch")
+
+    with life_col2:
+        churn = get_monthly_churn(cities=city_filter, routes=route_filter).dropna(subset=['churn_rate'])
+        fig4 = px.bar(
+            churn, x='month', y='churn_rate', title="Monthly Churn Rate",
+            template=plot_template,
+            labels={"month": "Month", "churn_rate": "Licences Removed"}
+        )
+        fig4.update_traces(marker_color='#667eea')
+        fig4.update_layout(
+            plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+            title_x=0.5, yaxis=dict(tickformat=".1%")
+        )
+        st.plotly_chart(fig4, width="stretch")
+
+    median_columns = {
+        "median_months": st.column_config.NumberColumn("Median Lifetime (months)", help="Blank while most licences are still active"),
+        "licences": "Licences",
+        "removed": "Removed",
+    }
+    median_col1, median_col2 = st.columns(2, gap="medium")
+
+    with median_col1:
+        st.subheader("Median Lifetime by Route")
+        st.dataframe(
+            get_median_lifetimes('route', cities=city_filter, routes=route_filter),
+            column_config={"route": "Visa Route", **median_columns},
+            hide_index=True,
+            width="stretch"
+        )
+
+    with median_col2:
+        st.subheader("Median Lifetime by City")
+        st.dataframe(
+            get_median_lifetimes('town_city', cities=city_filter, routes=route_filter),
+            column_config={"town_city": "City", **median_columns},
+            hide_index=True,
+            width="stretch"
+        )
 
 # Footer
 st.markdown("<br>", unsafe_allow_html=True)
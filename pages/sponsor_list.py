@@ -1,14 +1,8 @@
 import streamlit as st
-from sponsor_analytics import get_all_sponsors
+from sponsor_analytics import filter_sponsor_rows, get_organisation_profile, get_shared_sponsors, sponsor_table
+from sponsor_export import EXPORT_FORMATS, export_sponsors
 from datetime import datetime
 
-st.set_page_config(
-    page_title="Sponsor List",
-    page_icon="📋",
-    layout="wide",
-    initial_sidebar_state="collapsed"
-)
-
 # Modern CSS matching the dashboard design
 st.markdown("""
 <style>
@@ -277,8 +271,9 @@ st.markdown("""
 # Title
 st.title("📋 Sponsor List")
 
-# Get data - now using all sponsors instead of just recent ones
-all_sponsors = get_all_sponsors()
+# Get data - one shared copy of all sponsors for every session in this process
+dataset = get_shared_sponsors()
+all_sponsors = dataset.sponsors
 
 # Modern search container
 st.markdown('<div class="search-container">', unsafe_allow_html=True)
@@ -291,41 +286,43 @@ st.markdown('<div class="filter-container">', unsafe_allow_html=True)
 st.markdown('<div class="filter-header">🔍 Search & Filter Options</div>', unsafe_allow_html=True)
 
 # Filter options in columns
-filter_col1, filter_col2 = st.columns([1, 1])
+filter_col1, filter_col2, filter_col3 = st.columns([1, 1, 1])
 
 with filter_col1:
     with st.expander("🏢 Location", expanded=True):
-        city_filter = st.multiselect("Filter by City", options=sorted(all_sponsors['town_city'].unique()))
+        city_filter = st.multiselect("Filter by City", options=dataset.cities)
 
 with filter_col2:
     with st.expander("🛂 Visa Routes", expanded=True):
-        route_filter = st.multiselect("Filter by Visa Route", options=sorted(all_sponsors['route'].unique()))
+        route_filter = st.multiselect("Filter by Visa Route", options=dataset.routes)
 
-st.markdown('</div>', unsafe_allow_html=True)
+with filter_col3:
+    with st.expander("⭐ Type & Rating", expanded=True):
+        worker_type_filter = st.multiselect("Filter by Worker Type", options=dataset.worker_types)
+        rating_filter = st.multiselect("Filter by Rating", options=dataset.ratings)
 
-# Apply filters
-filtered_sponsors = all_sponsors
-if city_filter:
-    filtered_sponsors = filtered_sponsors[filtered_sponsors['town_city'].isin(city_filter)]
-if route_filter:
-    filtered_sponsors = filtered_sponsors[filtered_sponsors['route'].isin(route_filter)]
+st.markdown('</div>', unsafe_allow_html=True)
 
-table_df = filtered_sponsors.copy()
-if search_query:
-    table_df = table_df[table_df['organisation_name'].str.contains(search_query, case=False, na=False)]
+# Apply filters as row positions into the shared dataset; the table below
+# is the shared one when nothing is filtered out, and otherwise a copy of
+# the matching rows for this rerun only, not kept in the session
+matching_rows = filter_sponsor_rows(
+    dataset, city_filter, route_filter, search_query, worker_types=worker_type_filter, ratings=rating_filter
+)
+table_df = sponsor_table(dataset, matching_rows)
 
 # Modern results summary
-if search_query or city_filter or route_filter:
+if search_query or city_filter or route_filter or worker_type_filter or rating_filter:
     st.markdown(f'<div class="results-summary">📊 Showing {len(table_df):,} sponsors (filtered from {len(all_sponsors):,} total)</div>', unsafe_allow_html=True)
 else:
     st.markdown(f'<div class="results-summary">📊 Showing all {len(table_df):,} sponsors</div>', unsafe_allow_html=True)
 
 # Display table
 if not table_df.empty:
-    sorted_sponsors = table_df.sort_values('first_appeared_date', ascending=False)
+    # The shared dataset is already sorted newest first
     st.dataframe(
-        sorted_sponsors[['organisation_name', 'town_city', 'type_rating', 'route', 'first_appeared_date']],
-        use_container_width=True,
+        table_df,
+        width="stretch",
         hide_index=True,
         height=650,
         column_config={
@@ -339,6 +336,63 @@ if not table_df.empty:
 else:
     st.warning("⚠️ No sponsors found matching your criteria. Try adjusting your filters.")
 
+# ===== COMPANY DETAILS SECTION =====
+MAX_DETAIL_OPTIONS = 1000
+
+if not table_df.empty:
+    with st.expander("🏷️ Company Details", expanded=bool(search_query)):
+        company_names = table_df['organisation_name'].drop_duplicates()
+        if len(company_names) > MAX_DETAIL_OPTIONS:
+            st.caption(f"Search or filter to {MAX_DETAIL_OPTIONS:,} companies or fewer to view company details.")
+        else:
+            selected_company = st.selectbox(
+                "Select a company", options=sorted(company_names), index=None,
+                placeholder="Choose a company to see its licence history..."
+            )
+            profile = get_organisation_profile(selected_company) if selected_company else None
+            if selected_company and profile is None:
+                st.info("No licence history recorded for this company yet.")
+            elif profile:
+                status = f"Removed {profile['removed_date']}" if profile['removed_date'] else "Active"
+                detail_cols = st.columns(3)
+                detail_cols[0].metric("First Seen", profile['first_seen_date'])
+                detail_cols[1].metric("Last Seen", profile['last_seen_date'])
+                detail_cols[2].metric("Status", status)
+                st.write(f"**Location:** {profile['town_city'] or '—'}{', ' + profile['county'] if profile['county'] else ''}")
+                st.write(f"**Current routes:** {', '.join(profile['current_routes']) or 'None'}")
+                st.dataframe(
+                    profile['events'],
+                    hide_index=True,
+                    width="stretch",
+                    column_config={
+                        "date": st.column_config.TextColumn("Date", width="small"),
+                        "event": st.column_config.TextColumn("Event", width="small"),
+                        "route": st.column_config.TextColumn("Visa Route", width="medium"),
+                        "type_rating": st.column_config.TextColumn("Type & Rating", width="medium"),
+                        "previous_type_rating": st.column_config.TextColumn("Previous Rating", width="medium")
+                    }
+                )
+
+# ===== EXPORT SECTION =====
+# Exports are generated only when a button is clicked, by streaming the
+# same filters straight from the database into the download file
+if not table_df.empty:
+    export_cols = st.columns(len(EXPORT_FORMATS))
+    export_stamp = datetime.now().strftime("%Y-%m-%d")
+    for export_col, (export_format, export_info) in zip(export_cols, EXPORT_FORMATS.items()):
+        with export_col:
+            st.download_button(
+                f"⬇️ Export {export_format.upper()}",
+                data=lambda export_format=export_format: export_sponsors(
+                    export_format, cities=city_filter, routes=route_filter, search=search_query,
+                    worker_types=worker_type_filter, ratings=rating_filter
+                ),
+                file_name=f"uk_sponsors_{export_stamp}.{export_info['extension']}",
+                mime=export_info['mime'],
+                on_click="ignore",
+                width="stretch"
+            )
+
 # Footer
 st.markdown("<br>", unsafe_allow_html=True)
 st.markdown("---")
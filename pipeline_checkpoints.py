@@ -0,0 +1,89 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from db_utils import DB_PATH, setup_database
+
+# Stages of a daily run, in order. Each records what it produced so a rerun
+# for the same as-of date can pick up where the last attempt stopped.
+STAGES = ('download', 'clean', 'diff', 'commit')
+
+# Intermediate results kept so a failed run can resume where it stopped
+CHECKPOINT_DIR = 'data/processed/checkpoints'
+
+def get_checkpoints(as_of, db_path=DB_PATH):
+    """Return {stage: detail} for the completed stages of the run for as_of."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        # A database from before checkpoints were recorded has no table yet
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pipeline_checkpoints'"
+        ).fetchone()
+        rows = conn.execute(
+            "SELECT stage, detail FROM pipeline_checkpoints WHERE run_date = ?", (as_of,)
+        ).fetchall() if has_table else []
+    finally:
+        conn.close()
+    return {stage: json.loads(detail) for stage, detail in rows}
+
+def record_checkpoint(conn, as_of, stage, detail):
+    """Record a completed stage on conn without committing.
+
+    The commit stage is recorded this way so it lands in the same
+    transaction as the data it describes.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+    conn.execute("""
+    INSERT OR REPLACE INTO pipeline_checkpoints (run_date, stage, detail, completed_at)
+    VALUES (?, ?, ?, ?)
+    """, (as_of, stage, json.dumps(detail), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+def save_checkpoint(as_of, stage, detail, db_path=DB_PATH):
+    """Record a completed stage in its own transaction."""
+    conn = setup_database(db_path)
+    record_checkpoint(conn, as_of, stage, detail)
+    conn.commit()
+    conn.close()
+
+def sidecar_path(as_of, stage):
+    return os.path.join(CHECKPOINT_DIR, f"{stage}_{as_of}.json")
+
+def save_sidecar_checkpoint(as_of, stage, detail):
+    """Record a completed stage in a file instead of the database.
+
+    Used when the database must not be written, such as the live file
+    during a publish run, which is only ever replaced by a swap.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    with open(sidecar_path(as_of, stage), 'w') as file:
+        json.dump(detail, file)
+
+def prune_checkpoint_files(before):
+    """Delete the checkpoint files of runs dated before the given date.
+
+    Called once a run has committed: an earlier date's saved data, changes
+    and sidecars are then never resumed from. Returns the number removed.
+    """
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return 0
+    removed = 0
+    for name in os.listdir(CHECKPOINT_DIR):
+        stage, _, rest = os.path.splitext(name)[0].partition('_')
+        if stage in STAGES and rest < before:
+            os.remove(os.path.join(CHECKPOINT_DIR, name))
+            removed += 1
+    return removed
+
+def get_sidecar_checkpoint(as_of, stage):
+    """Return the detail saved by save_sidecar_checkpoint, or None."""
+    path = sidecar_path(as_of, stage)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
@@ -1,81 +1,365 @@
+import numpy as np
 import pandas as pd
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
 import os
-from db_utils import setup_database
+from db_utils import DB_PATH, setup_database
+from sponsor_diff import diff_keys, encode_keys
+from sponsor_profiles import update_organisation_profiles
+from sponsor_cube import update_sponsor_cube
+from sponsor_lifetimes import update_licence_removals
+from sponsor_codes import update_register_codes
+from sponsor_history import compact_partitions, history_dir, write_daily_changes
+from pipeline_checkpoints import (CHECKPOINT_DIR, get_checkpoints, get_sidecar_checkpoint, prune_checkpoint_files,
+                                  record_checkpoint, save_sidecar_checkpoint)
+from sponsor_validation import save_quarantine, validate_sponsor_data
 
-def clean_csv_data(csv_file):
-    """Clean and prepare the CSV data."""
-    df = pd.read_csv(csv_file)
+# Mapping from the GOV.UK CSV headers to database columns
+COLUMN_MAP = {
+    'Organisation Name': 'organisation_name',
+    'Town/City': 'town_city',
+    'County': 'county',
+    'Type & Rating': 'type_rating',
+    'Route': 'route'
+}
+
+# Columns that can change for an existing (organisation_name, route) entry
+DETAIL_COLUMNS = ['town_city', 'county', 'type_rating']
 
-    # Fill NaN values with empty strings
-    df = df.fillna('')
+# Cleaning runs serially unless a caller asks for workers, e.g. with
+# daily_pipeline.py --workers. The built-in
+# transforms clean a row faster than it can be pickled to a worker and back
+# (400k rows: 0.08s serial, 0.10s pickling alone, 0.32s with 4 workers), so
+# a pool only pays off for heavier custom transforms, on frames this large.
+PARALLEL_MIN_ROWS = 100_000
 
-    # Clean city names
+def fill_missing_values(df):
+    """Fill NaN values with empty strings."""
+    return df.fillna('')
+
+def clean_town_city(df):
+    """Keep letters and spaces only in city names and title-case them."""
     if 'Town/City' in df.columns:
         df['Town/City'] = df['Town/City'].str.replace(r'[^a-zA-Z\s]', '', regex=True).str.strip().str.title()
-    
+    return df
 
+# Cleaning steps applied in order. Each takes and returns a DataFrame and
+# must only look at values within a row, so partitions can be cleaned
+# independently and give the same result as cleaning the whole frame.
+CLEANING_TRANSFORMS = [
+    fill_missing_values,
+    clean_town_city,
+]
+
+def apply_transforms(df, transforms):
+    """Apply cleaning transforms to a DataFrame in order."""
+    for transform in transforms:
+        df = transform(df)
     return df
 
-def process_daily_update(csv_file):
-    """Process the daily update and update the database."""
-    today = datetime.now().strftime("%Y-%m-%d")
+def clean_dataframe(df, transforms=None, workers=None):
+    """Run the cleaning transforms, splitting large frames across a pool of workers if given."""
+    transforms = CLEANING_TRANSFORMS if transforms is None else transforms
 
-    # Ensure database exists
-    conn = setup_database()
+    if workers is None or workers <= 1 or len(df) < PARALLEL_MIN_ROWS:
+        return apply_transforms(df, transforms)
 
-    # Clean and prepare the CSV data
-    df_new = clean_csv_data(csv_file)
+    # Contiguous row partitions keep the original order when concatenated
+    size = -(-len(df) // workers)
+    partitions = [df.iloc[start:start + size] for start in range(0, len(df), size)]
 
-    print(f"Total entries in new data: {len(df_new)}")
+    with ProcessPoolExecutor(max_workers=len(partitions)) as pool:
+        cleaned = list(pool.map(apply_transforms, partitions, repeat(transforms)))
+
+    return pd.concat(cleaned)
+
+def clean_csv_data(csv_file, workers=None):
+    """Clean and prepare the CSV data."""
+    df = pd.read_csv(csv_file)
+    return clean_dataframe(df, workers=workers)
+
+def find_changed_entries(df_new, df_existing, retained_new, retained_old):
+    """Find entries present in both datasets whose details have changed.
+
+    retained_new and retained_old are matching positional indices of the
+    rows present in both datasets, as returned by diff_keys.
+    """
+    # Only the detail columns of retained rows are compared, as Series so
+    # string columns stay in their native storage. A missing value counts
+    # as empty on both sides.
+    renamed = df_new.rename(columns=COLUMN_MAP)
+    changed = np.zeros(len(retained_new), dtype=bool)
+    for col in DETAIL_COLUMNS:
+        current = renamed[col].iloc[retained_new].fillna('').astype(str).reset_index(drop=True)
+        previous = df_existing[col].iloc[retained_old].fillna('').astype(str).reset_index(drop=True)
+        changed |= (current != previous).to_numpy()
+
+    changed_entries = renamed.iloc[retained_new[changed]].reset_index(drop=True)
+    previous = df_existing.iloc[retained_old[changed]]
+    for col in DETAIL_COLUMNS:
+        changed_entries[f'{col}_previous'] = previous[col].to_numpy()
+    changed_entries['first_appeared_date'] = previous['first_appeared_date'].to_numpy()
+    return changed_entries
+
+def compute_daily_delta(df_new, df_existing, quarantined=None):
+    """Split today's data into new, reinstated, removed and changed entries.
+
+    Reinstated entries are rows of today's data whose key is already in the
+    database from an earlier removal. Entries whose row in today's data was
+    quarantined are still listed, so they are not reported as removed.
+    """
+    if df_existing.empty:
+        print("No existing data, treating all as new entries")
+        columns = list(COLUMN_MAP.values())
+        removed = pd.DataFrame(columns=columns + ['first_appeared_date', 'last_updated_date'])
+        changed = pd.DataFrame(columns=columns + [f'{col}_previous' for col in DETAIL_COLUMNS] + ['first_appeared_date'])
+        return df_new, df_new.iloc[0:0], removed, changed
+
+    diff = diff_keys(*encode_keys(
+        df_new['Organisation Name'], df_new['Route'],
+        df_existing['organisation_name'], df_existing['route']
+    ))
 
-    # Get existing data from database
+    # Find new entries (in new but not in existing)
+    new_entries = df_new.iloc[diff.added]
+    print(f"New entries identified: {len(new_entries)}")
+
+    # Find removed entries (in existing but not in new). Only entries that
+    # were current on the previous run count, so past removals that are
+    # still in the table are not reported again every day.
+    latest_seen = df_existing['last_updated_date'].max()
+    is_current = (df_existing['last_updated_date'] == latest_seen).to_numpy()
+    was_current = is_current[diff.removed]
+    removed = diff.removed[was_current]
+    if quarantined is not None and len(quarantined):
+        held = np.isin(*encode_keys(
+            df_existing['organisation_name'].iloc[removed], df_existing['route'].iloc[removed],
+            quarantined['Organisation Name'], quarantined['Route']
+        ))
+        if held.any():
+            print(f"Entries kept despite a quarantined row: {held.sum()}")
+        removed = removed[~held]
+    removed_entries = df_existing.iloc[removed]
+    print(f"Removed entries identified: {len(removed_entries)}")
+
+    # Find reinstated entries (back in the new data after a removal). They
+    # keep the date they first appeared.
+    was_removed = ~is_current[diff.retained_old]
+    reinstated_entries = df_new.iloc[diff.retained_new[was_removed]].assign(
+        first_appeared_date=df_existing['first_appeared_date'].iloc[diff.retained_old[was_removed]].to_numpy()
+    )
+    if not reinstated_entries.empty:
+        print(f"Reinstated entries identified: {len(reinstated_entries)}")
+
+    # Find changed entries (current in both, but with different details)
+    changed_entries = find_changed_entries(
+        df_new, df_existing, diff.retained_new[~was_removed], diff.retained_old[~was_removed]
+    )
+    print(f"Changed entries identified: {len(changed_entries)}")
+
+    return new_entries, reinstated_entries, removed_entries, changed_entries
+
+def build_delta(new_entries, reinstated_entries, removed_entries, changed_entries, today):
+    """Collect the day's changes by type, using database column names.
+
+    Reinstated entries are reported as added alongside brand new ones.
+    """
+    return {
+        'added': pd.concat([
+            new_entries.assign(first_appeared_date=today),
+            reinstated_entries
+        ]).rename(columns=COLUMN_MAP),
+        'removed': removed_entries,
+        'changed': changed_entries
+    }
+
+def write_change_report(delta, today):
+    """Write the day's changes to a single CSV report and return its path."""
+    report = pd.concat([
+        df.assign(change_type=change_type) for change_type, df in delta.items()
+    ], ignore_index=True)
+    columns = ['change_type'] + [col for col in report.columns if col != 'change_type']
+
+    os.makedirs('data/processed', exist_ok=True)
+    filename = f'data/processed/change_report_{today}.csv'
+    report[columns].to_csv(filename, index=False)
+    return filename
+
+def read_existing_entries(conn):
+    """Read the current register from the database."""
     try:
-        df_existing = pd.read_sql("SELECT * FROM sponsor_register", conn)
+        # The code columns are derived from these and are not compared
+        df_existing = pd.read_sql("""
+        SELECT organisation_name, town_city, county, type_rating, route,
+               first_appeared_date, last_updated_date
+        FROM sponsor_register
+        """, conn)
         print(f"Existing entries in database: {len(df_existing)}")
     except Exception as e:
         print(f"Error reading existing data: {str(e)}")
         # If table doesn't exist or is empty
         df_existing = pd.DataFrame(columns=['organisation_name', 'route'])
         print("Created empty DataFrame for existing data")
+    return df_existing
+
+def checkpoint_file(as_of, stage):
+    return os.path.join(CHECKPOINT_DIR, f"{stage}_{as_of}.pkl")
+
+def register_basis(conn):
+    """Identify the register state a diff was computed against."""
+    latest, runs = conn.execute("SELECT MAX(date), COUNT(*) FROM daily_updates").fetchone()
+    return f"{latest}.{runs}"
 
-    # Create a composite key for comparison
-    def create_composite_key(df, org_col, route_col):
-        return df[org_col].astype(str) + '|' + df[route_col].astype(str)
+def load_or_clean(conn, csv_file, as_of, checkpoints, workers=None, sidecar=False):
+    """Clean the CSV, or reuse the cleaned data saved by an earlier attempt.
 
-    if not df_existing.empty:
-        df_new['composite_key'] = create_composite_key(df_new, 'Organisation Name', 'Route')
-        df_existing['composite_key'] = create_composite_key(df_existing, 'organisation_name', 'route')
+    With sidecar=True the stage is also recorded in a sidecar file, which
+    outlives a working database that is thrown away when a run fails.
+    """
+    cleaned = checkpoints.get('clean')
+    if cleaned and cleaned['csv_file'] == csv_file and os.path.exists(cleaned['file']):
+        print(f"Resuming from cleaned data in {cleaned['file']}")
+        return pd.read_pickle(cleaned['file'])
+
+    df_new = clean_csv_data(csv_file, workers=workers)
+    path = checkpoint_file(as_of, 'clean')
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    df_new.to_pickle(path)
+    detail = {'csv_file': csv_file, 'file': path}
+    record_checkpoint(conn, as_of, 'clean', detail)
+    conn.commit()
+    if sidecar:
+        save_sidecar_checkpoint(as_of, 'clean', detail)
+    return df_new
 
-        # Find new entries (in new but not in existing)
-        new_entries = df_new[~df_new['composite_key'].isin(df_existing['composite_key'])]
-        print(f"New entries identified: {len(new_entries)}")
+def load_or_diff(conn, df_new, quarantined, as_of, checkpoints, sidecar=False):
+    """Compute the daily delta, or reuse one computed against the same register state.
 
-        # Find removed entries (in existing but not in new)
-        removed_entries = df_existing[~df_existing['composite_key'].isin(df_new['composite_key'])]
-        print(f"Removed entries identified: {len(removed_entries)}")
+    sidecar is as for load_or_clean.
+    """
+    basis = register_basis(conn)
+    saved = checkpoints.get('diff')
+    if saved and saved['basis'] == basis and os.path.exists(saved['file']):
+        print(f"Resuming from computed changes in {saved['file']}")
+        return pd.read_pickle(saved['file'])
 
-        # Drop the temporary composite key
-        new_entries = new_entries.drop(columns=['composite_key'])
-        removed_entries = removed_entries.drop(columns=['composite_key'])
-        df_new = df_new.drop(columns=['composite_key'])
-        df_existing = df_existing.drop(columns=['composite_key'])
+    frames = compute_daily_delta(df_new, read_existing_entries(conn), quarantined)
+    path = checkpoint_file(as_of, 'diff')
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    pd.to_pickle(frames, path)
+    detail = {'basis': basis, 'file': path}
+    record_checkpoint(conn, as_of, 'diff', detail)
+    conn.commit()
+    if sidecar:
+        save_sidecar_checkpoint(as_of, 'diff', detail)
+    return frames
+
+def committed_results(as_of, checkpoints):
+    """Rebuild the results of a run that has already been committed."""
+    results = dict(checkpoints['commit'], date=as_of)
+    diff = checkpoints.get('diff')
+    if diff and os.path.exists(diff['file']):
+        results['delta'] = build_delta(*pd.read_pickle(diff['file']), as_of)
     else:
-        new_entries = df_new
-        removed_entries = pd.DataFrame()
-        print("No existing data, treating all as new entries")
+        empty = pd.DataFrame(columns=list(COLUMN_MAP.values()))
+        results['delta'] = {'added': empty, 'removed': empty, 'changed': empty}
+    return results
+
+def preview_daily_update(csv_file, db_path=DB_PATH, as_of=None, workers=None):
+    """Compute the daily changes and write a change report without touching the database."""
+    today = as_of or datetime.now().strftime("%Y-%m-%d")
+
+    df_new = clean_csv_data(csv_file, workers=workers)
+    print(f"Total entries in new data: {len(df_new)}")
+    df_new, quarantined = validate_sponsor_data(df_new)
+
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        df_existing = read_existing_entries(conn)
+        conn.close()
+    else:
+        df_existing = pd.DataFrame(columns=['organisation_name', 'route'])
+
+    new_entries, reinstated_entries, removed_entries, changed_entries = compute_daily_delta(df_new, df_existing, quarantined)
+    delta = build_delta(new_entries, reinstated_entries, removed_entries, changed_entries, today)
+    report_file = write_change_report(delta, today)
+    print(f"Dry run: wrote change report to {report_file}, database not modified")
+
+    return {
+        'date': today,
+        'new_entries': len(new_entries),
+        'removed_entries': len(removed_entries),
+        'reinstated_entries': len(reinstated_entries),
+        'changed_entries': len(changed_entries),
+        'quarantined_entries': len(quarantined),
+        'report_file': report_file,
+        'delta': delta
+    }
+
+def process_daily_update(csv_file, db_path=DB_PATH, as_of=None, history_directory=None, workers=None,
+                         sidecar_checkpoints=False):
+    """Process the daily update and update the database.
+
+    as_of is the date the update is recorded under, today by default. Each
+    stage is checkpointed in the database, so rerunning the same date
+    resumes after the last completed stage, and a committed date is not
+    written again. Changes are recorded in history_directory, the history
+    next to db_path by default. workers is passed on to clean_dataframe.
+
+    With sidecar_checkpoints=True the clean and diff stages are also
+    recorded in sidecar files and resumed from them, for a db_path that is
+    a working copy discarded when the run fails.
+    """
+    today = as_of or datetime.now().strftime("%Y-%m-%d")
+
+    # Ensure database exists
+    conn = setup_database(db_path)
+    try:
+        return apply_daily_update(conn, csv_file, db_path, today, history_directory or history_dir(db_path),
+                                  workers, sidecar_checkpoints)
+    except Exception:
+        # Leave the database as it was before this attempt
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def apply_daily_update(conn, csv_file, db_path, today, history_directory, workers=None, sidecar_checkpoints=False):
+    """Run the stages of process_daily_update for one date on an open connection."""
+    checkpoints = get_checkpoints(today, db_path)
+    if 'commit' in checkpoints:
+        print(f"Update for {today} was already committed, nothing to write")
+        return committed_results(today, checkpoints)
+    if sidecar_checkpoints:
+        for stage in ('clean', 'diff'):
+            saved = get_sidecar_checkpoint(today, stage)
+            if saved and stage not in checkpoints:
+                checkpoints[stage] = saved
+
+    latest_run = conn.execute("SELECT MAX(date) FROM daily_updates").fetchone()[0]
+    if latest_run and today < latest_run:
+        raise Exception(f"Cannot process {today}: the register already has a later update from {latest_run}")
+
+    # Clean and prepare the CSV data
+    df_new = load_or_clean(conn, csv_file, today, checkpoints, workers, sidecar_checkpoints)
+
+    print(f"Total entries in new data: {len(df_new)}")
+
+    # Validate before anything is written; failing rows are quarantined
+    df_new, quarantined = validate_sponsor_data(df_new)
+
+    # Compare with the existing data in the database
+    previous_latest = conn.execute("SELECT MAX(last_updated_date) FROM sponsor_register").fetchone()[0]
+    new_entries, reinstated_entries, removed_entries, changed_entries = load_or_diff(conn, df_new, quarantined, today, checkpoints, sidecar_checkpoints)
+
+    save_quarantine(conn, quarantined, today)
 
     # Prepare new entries for database insertion
     if not new_entries.empty:
         # Rename columns to match database schema
-        new_entries_db = new_entries.rename(columns={
-            'Organisation Name': 'organisation_name',
-            'Town/City': 'town_city',
-            'County': 'county',
-            'Type & Rating': 'type_rating',
-            'Route': 'route'
-        })
+        new_entries_db = new_entries.rename(columns=COLUMN_MAP)
 
         # Add tracking dates
         new_entries_db['first_appeared_date'] = today
@@ -109,7 +393,8 @@ def process_daily_update(csv_file):
                 try:
                     cursor.execute("""
                     UPDATE sponsor_register
-                    SET town_city = ?, county = ?, type_rating = ?, last_updated_date = ?
+                    SET town_city = ?, county = ?, type_rating = ?, last_updated_date = ?,
+                        route_code = NULL, city_code = NULL, worker_type_code = NULL, rating_code = NULL
                     WHERE organisation_name = ? AND route = ?
                     """, (
                         row['town_city'],
@@ -124,8 +409,26 @@ def process_daily_update(csv_file):
 
         print(f"Inserted {inserted_count} new entries, encountered {error_count} errors")
 
-    # Update last_updated_date for existing entries
+    # Update details for changed and reinstated entries
     cursor = conn.cursor()
+    detail_updates = pd.concat([changed_entries, reinstated_entries.rename(columns=COLUMN_MAP)])
+    for _, row in detail_updates.iterrows():
+        cursor.execute("""
+        UPDATE sponsor_register
+        SET town_city = ?, county = ?, type_rating = ?,
+            route_code = NULL, city_code = NULL, worker_type_code = NULL, rating_code = NULL
+        WHERE organisation_name = ? AND route = ?
+        """, (
+            row['town_city'],
+            row['county'],
+            row['type_rating'],
+            row['organisation_name'],
+            row['route']
+        ))
+    if not detail_updates.empty:
+        print(f"Updated details for {len(detail_updates)} changed or reinstated entries")
+
+    # Update last_updated_date for existing entries
     update_count = 0
     for _, row in df_new.iterrows():
         try:
@@ -144,6 +447,22 @@ def process_daily_update(csv_file):
 
     print(f"Updated last_updated_date for {update_count} existing entries")
 
+    # A licence whose row was quarantined today is still on the register, so
+    # it stays current with the details last recorded for it
+    held_count = 0
+    for name, route in quarantined[['Organisation Name', 'Route']].itertuples(index=False, name=None):
+        cursor.execute("""
+        UPDATE sponsor_register
+        SET last_updated_date = ?
+        WHERE organisation_name = ? AND route = ? AND last_updated_date = ?
+        """, (today, name, route, previous_latest))
+        held_count += cursor.rowcount
+    if held_count:
+        print(f"Kept {held_count} current entries whose rows were quarantined")
+
+    # Code the values of inserted and updated rows for bitmap filtering
+    update_register_codes(conn)
+
     # Log daily changes
     try:
         cursor.execute(
@@ -154,16 +473,38 @@ def process_daily_update(csv_file):
     except Exception as e:
         print(f"Error logging daily changes: {str(e)}")
 
+    delta = build_delta(new_entries, reinstated_entries, removed_entries, changed_entries, today)
+
+    # Keep per-organisation profiles in step with today's changes
+    update_organisation_profiles(conn, delta, today)
+    update_sponsor_cube(conn, delta, today)
+    update_licence_removals(conn, delta, today)
+
+    # Record the day's changes in the monthly history partitions. A rerun
+    # replaces the date's rows, so this is done before the commit.
+    write_daily_changes(conn, delta, today, history_directory)
+    compact_partitions(history_directory, today[:7])
+
+    # The commit checkpoint is part of the same transaction as the data
+    counts = {
+        'new_entries': len(new_entries),
+        'removed_entries': len(removed_entries),
+        'reinstated_entries': len(reinstated_entries),
+        'changed_entries': len(changed_entries),
+        'quarantined_entries': len(quarantined),
+    }
+    record_checkpoint(conn, today, 'commit', counts)
     conn.commit()
-    conn.close()
+
+    # The changes stay saved for a rerun of later steps; cleaned data is no
+    # longer needed, and nothing from earlier dates is resumed any more
+    if os.path.exists(checkpoint_file(today, 'clean')):
+        os.remove(checkpoint_file(today, 'clean'))
+    prune_checkpoint_files(today)
 
     # Save processed data for reference
     os.makedirs('data/processed', exist_ok=True)
     if not new_entries.empty:
         new_entries.to_csv(f'data/processed/new_sponsors_{today}.csv', index=False)
 
-    return {
-        'date': today,
-        'new_entries': len(new_entries),
-        'removed_entries': len(removed_entries)
-    }
\ No newline at end of file
+    return dict(counts, date=today, delta=delta)
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+from db_utils import DB_PATH, setup_alerts_database, setup_database
+
+# Larger pages suit the read-mostly, scan-heavy analytics queries
+PUBLISH_PAGE_SIZE = 8192
+
+# Tables keyed by a natural primary key are stored clustered on that key
+WITHOUT_ROWID_TABLES = {'sponsor_register', 'daily_updates'}
+
+# Tables earlier versions kept in the register database. They hold
+# subscriber email addresses and now live in the alerts database, so they
+# are never carried into a published file.
+PRIVATE_TABLES = {'saved_searches', 'alert_outbox'}
+
+# Written into the staged history once the database it belongs to is live
+PUBLISHED_MARKER = '.published'
+
+# Load order for each table, matching its primary key
+TABLE_ORDER = {
+    'sponsor_register': 'organisation_name, route',
+    'daily_updates': 'date',
+    'organisation_profiles': 'organisation_name',
+    'organisation_events': 'organisation_name, date, route, event',
+    'sponsor_cube': 'first_appeared_date, town_city, route',
+    'licence_removals': 'first_month, removed_month, route, town_city',
+    'register_codes': 'dimension, code',
+}
+
+def staging_path(db_path=DB_PATH, suffix='staging'):
+    return f"{db_path}.{suffix}"
+
+def _remove(path):
+    for candidate in (path, f"{path}-journal", f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+def stage_database(db_path=DB_PATH):
+    """Copy the live database to a private working file for the pipeline to update."""
+    working_path = staging_path(db_path)
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    _remove(working_path)
+
+    target = sqlite3.connect(working_path)
+    if os.path.exists(db_path):
+        source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        source.backup(target)
+        source.close()
+    target.close()
+
+    # Make sure the working copy has the current schema
+    setup_database(working_path).close()
+    return working_path
+
+def _schema(conn):
+    """Return (tables, indexes) as lists of (name, sql) from sqlite_master."""
+    rows = conn.execute("""
+    SELECT type, name, sql FROM sqlite_master
+    WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+    ORDER BY type DESC, name
+    """).fetchall()
+    tables = [(name, sql) for type_, name, sql in rows if type_ == 'table']
+    indexes = [(name, sql) for type_, name, sql in rows if type_ == 'index']
+    return tables, indexes
+
+def _table_sql(name, sql):
+    sql = sql.strip()
+    if name in WITHOUT_ROWID_TABLES and 'WITHOUT ROWID' not in sql.upper():
+        sql = f"{sql} WITHOUT ROWID"
+    return sql
+
+def build_published_database(source_path, target_path):
+    """Build a compact, indexed, analysed copy of source_path at target_path.
+
+    PRIVATE_TABLES and their indexes are left out.
+    """
+    _remove(target_path)
+
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    tables, indexes = _schema(source)
+    private_indexes = {name for (name,) in source.execute(
+        f"SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name IN ({','.join('?' * len(PRIVATE_TABLES))})",
+        sorted(PRIVATE_TABLES)
+    )}
+    source.close()
+    tables = [(name, sql) for name, sql in tables if name not in PRIVATE_TABLES]
+    indexes = [(name, sql) for name, sql in indexes if name not in private_indexes]
+
+    conn = sqlite3.connect(f"file:{target_path}", uri=True)
+    conn.execute(f"PRAGMA page_size = {PUBLISH_PAGE_SIZE}")
+    # Nothing reads the file until it is swapped in, so skip the journal
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("ATTACH DATABASE ? AS source", (f"file:{source_path}?mode=ro",))
+
+    # Bulk load each table in primary key order, then build indexes
+    conn.execute("BEGIN")
+    for name, sql in tables:
+        conn.execute(_table_sql(name, sql))
+        order = f" ORDER BY {TABLE_ORDER[name]}" if name in TABLE_ORDER else ""
+        conn.execute(f"INSERT INTO main.{name} SELECT * FROM source.{name}{order}")
+    for name, sql in indexes:
+        conn.execute(sql)
+    conn.execute("COMMIT")
+    conn.execute("DETACH DATABASE source")
+
+    conn.execute("ANALYZE")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+    # Flush the finished file before it becomes visible
+    with open(target_path, 'rb+') as file:
+        os.fsync(file.fileno())
+    return target_path
+
+def swap_in(new_path, db_path=DB_PATH):
+    """Atomically replace the live database with new_path.
+
+    Readers that already have the old file open keep reading it unchanged;
+    new connections see the new file. Nobody sees a half-applied load.
+    """
+    os.replace(new_path, db_path)
+    directory = os.open(os.path.dirname(os.path.abspath(db_path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+def publish_daily_update(csv_file, db_path=DB_PATH, as_of=None, workers=None):
+    """Process a daily update off to the side and publish it with an atomic swap.
+
+    If the live database already has the update for as_of committed, it was
+    published by an earlier attempt and its results are read back without
+    rebuilding. The live file is only ever opened read-only.
+
+    Publishing owns every table of the register database: anything written
+    to the live file between staging and the swap is replaced. Saved
+    searches and the alert outbox are kept in the separate alerts database
+    for that reason, and alerts are queued there once the update is live.
+    Queuing is idempotent, so a rerun after a failure in between is safe.
+    Copies of those tables left in the register by earlier versions are
+    moved to the alerts database before the first publish drops them.
+
+    The working copy is removed if the run fails, so the clean and diff
+    stages are also recorded in sidecar files for a rerun to resume from.
+
+    History partitions are written to a staged copy of the history directory
+    and moved into place after the swap. If a run stops between the two,
+    the next publish run finishes moving them.
+    """
+    # Imported here so the build and swap helpers stay free of pandas
+    from process_sponsor_data import committed_results, process_daily_update
+    from sponsor_alerts import evaluate_alerts
+    from sponsor_history import history_dir, stage_history, swap_in_history
+    from pipeline_checkpoints import get_checkpoints
+
+    as_of = as_of or datetime.now().strftime("%Y-%m-%d")
+    setup_alerts_database(register_path=db_path).close()
+    live_history = history_dir(db_path)
+    working_history = staging_path(live_history)
+
+    # History staged by a run that stopped after its swap belongs to the live
+    # database; history staged by one that stopped before was never published
+    published_marker = os.path.join(working_history, PUBLISHED_MARKER)
+    if os.path.exists(published_marker):
+        swap_in_history(working_history, live_history)
+
+    checkpoints = get_checkpoints(as_of, db_path)
+    if 'commit' in checkpoints:
+        print(f"Update for {as_of} was already published, nothing to write")
+        results = committed_results(as_of, checkpoints)
+        evaluate_alerts(results['delta'], results['date'])
+        return results
+
+    working_path = stage_database(db_path)
+    publish_path = staging_path(db_path, 'publish')
+    stage_history(live_history, working_history)
+    try:
+        results = process_daily_update(csv_file, db_path=working_path, as_of=as_of,
+                                       history_directory=working_history, workers=workers,
+                                       sidecar_checkpoints=True)
+
+        print(f"Building published database at {publish_path}...")
+        build_published_database(working_path, publish_path)
+        swap_in(publish_path, db_path)
+        open(published_marker, 'w').close()
+        print(f"Published {db_path} ({os.path.getsize(db_path) / 1e6:.1f} MB) at {datetime.now().strftime('%H:%M:%S')}")
+    except Exception:
+        if not os.path.exists(published_marker):
+            # Nothing was published, so the staged history is discarded with it
+            shutil.rmtree(working_history, ignore_errors=True)
+        raise
+    finally:
+        _remove(working_path)
+        _remove(publish_path)
+
+    swap_in_history(working_history, live_history)
+    evaluate_alerts(results['delta'], results['date'])
+
+    return results
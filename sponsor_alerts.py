@@ -0,0 +1,240 @@
+import json
+import pandas as pd
+from collections import deque
+from datetime import datetime
+
+from db_utils import ALERTS_DB_PATH, setup_alerts_database
+from sponsor_codes import clean_city_name, parse_rating
+
+CHANGE_TYPES = ('added', 'removed', 'changed')
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds every keyword in a text in one pass."""
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+
+        for keyword_id, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                state = next_state
+            self.output[state].add(keyword_id)
+
+        # Breadth-first pass to build failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] |= self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """Return the ids of all keywords that occur in text."""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found |= self.output[state]
+        return found
+
+def _normalise(value):
+    return (value or '').strip().lower()
+
+def add_saved_search(email, cities=None, routes=None, ratings=None, keywords=None, change_types=None):
+    """Save a search to be alerted on. Returns the new search id."""
+    conn = setup_alerts_database()
+    cursor = conn.cursor()
+    cursor.execute("""
+    INSERT INTO saved_searches (email, cities, routes, ratings, keywords, change_types, created_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (
+        email,
+        json.dumps([clean_city_name(city) for city in cities or []]),
+        json.dumps(routes or []),
+        json.dumps(ratings or []),
+        json.dumps(keywords or []),
+        json.dumps(change_types or list(CHANGE_TYPES)),
+        datetime.now().strftime("%Y-%m-%d")
+    ))
+    search_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return search_id
+
+def remove_saved_search(search_id):
+    """Delete a saved search."""
+    conn = setup_alerts_database()
+    conn.execute("DELETE FROM saved_searches WHERE search_id = ?", (search_id,))
+    conn.commit()
+    conn.close()
+
+class AlertIndex:
+    """Inverted index over saved searches.
+
+    Each search is filed under one anchor: its keywords if it has any,
+    otherwise the values of the first facet in FACETS it sets, the most
+    selective first. Matching a row is one automaton pass over its name and
+    a lookup per facet to find the searches anchored on its values, then
+    checking only those against their other criteria. The cost follows how
+    many searches are anchored on the row's values, not how many searches
+    exist. Searches that set nothing but change types match every row of
+    those types and are kept per change type.
+    """
+
+    FACETS = ('cities', 'ratings', 'routes')
+
+    def __init__(self, searches):
+        self.searches = {search['search_id']: search for search in searches}
+        self.anchors = {facet: {} for facet in self.FACETS}
+        self.criteria = {}
+        self.unconditional = {change_type: set() for change_type in CHANGE_TYPES}
+
+        keywords = []
+        self.keyword_searches = []
+
+        for search_id, search in self.searches.items():
+            criteria = {
+                facet: {_normalise(value) for value in search[facet]}
+                for facet in self.FACETS + ('change_types',)
+            }
+            # Rows are matched on their cleaned city, so saved cities must be too
+            criteria['cities'] = {_normalise(clean_city_name(city)) for city in search['cities']}
+            # Only the criteria the search sets need checking
+            self.criteria[search_id] = [(facet, wanted) for facet, wanted in criteria.items() if wanted]
+
+            if search['keywords']:
+                for keyword in search['keywords']:
+                    keywords.append(_normalise(keyword))
+                    self.keyword_searches.append(search_id)
+                continue
+
+            anchor = next((facet for facet in self.FACETS if criteria[facet]), None)
+            if anchor is None:
+                for change_type in criteria['change_types'] or CHANGE_TYPES:
+                    self.unconditional.setdefault(change_type, set()).add(search_id)
+                continue
+            for value in criteria[anchor]:
+                self.anchors[anchor].setdefault(value, set()).add(search_id)
+
+        self.matcher = KeywordMatcher(keywords)
+
+    def match(self, change_type, row):
+        """Return the ids of searches that match a delta row."""
+        values = {
+            'cities': _normalise(clean_city_name(row.get('town_city'))),
+            'ratings': _normalise(parse_rating(row.get('type_rating'))),
+            'routes': _normalise(row.get('route')),
+            'change_types': _normalise(change_type),
+        }
+
+        candidates = set()
+        if self.keyword_searches:
+            name = _normalise(row.get('organisation_name'))
+            candidates.update(self.keyword_searches[i] for i in self.matcher.find(name))
+        for facet in self.FACETS:
+            candidates.update(self.anchors[facet].get(values[facet], ()))
+
+        matched = set(self.unconditional.get(values['change_types'], ()))
+        for search_id in candidates:
+            if all(values[facet] in wanted for facet, wanted in self.criteria[search_id]):
+                matched.add(search_id)
+        return matched
+
+def load_saved_searches(conn):
+    """Load all saved searches with their criteria decoded."""
+    rows = conn.execute("""
+    SELECT search_id, email, cities, routes, ratings, keywords, change_types
+    FROM saved_searches
+    """).fetchall()
+
+    searches = []
+    for search_id, email, cities, routes, ratings, keywords, change_types in rows:
+        searches.append({
+            'search_id': search_id,
+            'email': email,
+            'cities': json.loads(cities or '[]'),
+            'routes': json.loads(routes or '[]'),
+            'ratings': json.loads(ratings or '[]'),
+            'keywords': json.loads(keywords or '[]'),
+            'change_types': json.loads(change_types or '[]'),
+        })
+    return searches
+
+def evaluate_alerts(delta, date, db_path=ALERTS_DB_PATH):
+    """Match the day's added, removed and changed rows against saved searches.
+
+    Matches are written to the alert_outbox table for a mailer to send.
+    Returns the number of new alerts queued.
+    """
+    conn = setup_alerts_database(db_path)
+    searches = load_saved_searches(conn)
+    if not searches:
+        conn.close()
+        return 0
+
+    index = AlertIndex(searches)
+    alerts = []
+    for change_type in CHANGE_TYPES:
+        df = delta.get(change_type)
+        if df is None or df.empty:
+            continue
+        for row in df.to_dict(orient='records'):
+            for search_id in index.match(change_type, row):
+                alerts.append((
+                    search_id,
+                    index.searches[search_id]['email'],
+                    date,
+                    change_type,
+                    row.get('organisation_name'),
+                    row.get('town_city'),
+                    row.get('type_rating'),
+                    row.get('route')
+                ))
+
+    cursor = conn.cursor()
+    before = conn.total_changes
+    cursor.executemany("""
+    INSERT OR IGNORE INTO alert_outbox
+    (search_id, email, date, change_type, organisation_name, town_city, type_rating, route)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, alerts)
+    queued = conn.total_changes - before
+    conn.commit()
+    conn.close()
+
+    print(f"Queued {queued} alerts for {len(searches)} saved searches")
+    return queued
+
+def get_pending_alerts():
+    """Get alerts that have not been marked as sent."""
+    conn = setup_alerts_database()
+    df = pd.read_sql("SELECT * FROM alert_outbox WHERE sent_date IS NULL ORDER BY alert_id", conn)
+    conn.close()
+    return df
+
+def mark_alerts_sent(alert_ids):
+    """Mark outbox alerts as sent."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    conn = setup_alerts_database()
+    conn.executemany(
+        "UPDATE alert_outbox SET sent_date = ? WHERE alert_id = ?",
+        [(today, alert_id) for alert_id in alert_ids]
+    )
+    conn.commit()
+    conn.close()
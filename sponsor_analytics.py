@@ -1,21 +1,118 @@
+import numpy as np
 import pandas as pd
 import sqlite3
-import re
+import json
+import os
+import threading
+from collections import namedtuple
 from datetime import datetime, timedelta
+from db_utils import DB_PATH
+from sponsor_codes import CODE_COLUMNS, clean_city_name, code_values, parse_type_rating
+from sponsor_history import history_dir, read_changes
+
+_version_cache = {}
+
+# One read-only copy of the register per process, shared by every session
+SponsorDataset = namedtuple(
+    'SponsorDataset', ['version', 'sponsors', 'cities', 'routes', 'worker_types', 'ratings', 'indexes']
+)
+
+# Columns the Sponsor List shows; the shared dataset keeps only these
+SPONSOR_TABLE_COLUMNS = ['organisation_name', 'town_city', 'type_rating', 'route', 'first_appeared_date']
+_shared_dataset = {}
+_shared_lock = threading.Lock()
 
 def get_connection():
-    """Get a connection to the database."""
-    return sqlite3.connect('data/db/sponsor_register.db')
-
-def clean_city_name(city):
-    """Standardize city names to title case and remove extra characters"""
-    if pd.isna(city) or not isinstance(city, str):
-        return city
-    # Remove common punctuation and extra spaces
-    cleaned = re.sub(r'[,.]', '', city.strip())
-    # Convert to title case
-    cleaned = cleaned.title()
-    return cleaned
+    """Get a connection to the database.
+
+    A new connection is opened on every call, so readers pick up a newly
+    published database file as soon as it has been swapped in.
+    """
+    return sqlite3.connect(DB_PATH)
+
+class SQLiteBackend:
+    """Run aggregate queries directly against the SQLite database."""
+    name = 'sqlite'
+
+    def read_sql(self, query, params=()):
+        conn = get_connection()
+        try:
+            return pd.read_sql(query, conn, params=list(params))
+        finally:
+            conn.close()
+
+class DuckDBBackend:
+    """Run aggregate queries on an in-process DuckDB copy of the analytics tables.
+
+    The tables in ANALYTICS_TABLES are loaded from SQLite once per data
+    version and queried with DuckDB's columnar, vectorised engine. Queries
+    are written in SQL that both engines run with the same results.
+    """
+    name = 'duckdb'
+
+    # Column types declared in SQLite, as DuckDB types
+    TYPES = {'INTEGER': 'BIGINT', 'TEXT': 'VARCHAR', 'DATE': 'VARCHAR'}
+
+    def __init__(self):
+        # Optional dependency, only needed when this backend is selected
+        import duckdb
+        self._duckdb = duckdb
+        self._conn = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        conn = self._duckdb.connect()
+        source = get_connection()
+        try:
+            for table in ANALYTICS_TABLES:
+                columns = ', '.join(
+                    f"{name} {self.TYPES.get(declared.upper(), declared)}"
+                    for _, name, declared, *_ in source.execute(f"PRAGMA table_info({table})").fetchall()
+                )
+                conn.execute(f"CREATE TABLE {table} ({columns})")
+                frame = pd.read_sql(f"SELECT * FROM {table}", source)
+                if not frame.empty:
+                    conn.register('source_frame', frame)
+                    conn.execute(f"INSERT INTO {table} SELECT * FROM source_frame")
+                    conn.unregister('source_frame')
+        finally:
+            source.close()
+        return conn
+
+    def read_sql(self, query, params=()):
+        version = get_data_version()
+        with self._lock:
+            if self._version != version:
+                self._conn, self._version = self._load(), version
+            # Each query gets its own cursor so sessions can query concurrently
+            cursor = self._conn.cursor()
+        try:
+            return cursor.execute(query, list(params)).df()
+        finally:
+            cursor.close()
+
+# Tables the DuckDB backend loads. Point lookups and row listings stay on
+# SQLite, which answers them from its indexes.
+ANALYTICS_TABLES = ['sponsor_register', 'daily_updates', 'sponsor_cube', 'licence_removals']
+
+BACKENDS = {'sqlite': SQLiteBackend, 'duckdb': DuckDBBackend}
+
+# Backend used by the aggregate queries below; chosen with set_backend() or
+# the SPONSOR_ANALYTICS_BACKEND environment variable
+_backend = {}
+
+def set_backend(name):
+    """Select the engine that runs aggregate queries: 'sqlite' or 'duckdb'."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown analytics backend: {name}. Choose from {', '.join(BACKENDS)}")
+    _backend['instance'] = BACKENDS[name]()
+    return _backend['instance']
+
+def get_backend():
+    if 'instance' not in _backend:
+        set_backend(os.environ.get('SPONSOR_ANALYTICS_BACKEND', 'sqlite'))
+    return _backend['instance']
 
 def get_all_sponsors():
     """Get all sponsors from the database."""
@@ -32,6 +129,142 @@ def get_all_sponsors():
     df['town_city'] = df['town_city'].apply(clean_city_name)
     return df
 
+class BitmapIndex:
+    """Row sets of one coded dimension of the shared dataset, by value.
+
+    A value on at least 1/32 of the rows keeps a packed bitmap with one bit
+    per row. Rarer values keep their sorted row positions instead, which are
+    smaller at that density, so the long tail of small towns costs a few
+    integers each rather than a bitmap of every row.
+    """
+    DENSE_SHARE = 32
+
+    def __init__(self, codes, labels):
+        self.size = len(codes)
+        self.codes = {label: code for code, label in labels.items()}
+        self.bitmaps = {}
+        self.positions = {}
+
+        order = np.argsort(codes, kind='stable')
+        present, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+        for code, start, count in zip(present, starts, counts):
+            rows = order[start:start + count]
+            if count * self.DENSE_SHARE >= self.size:
+                self.bitmaps[code] = self._pack(rows)
+            else:
+                self.positions[code] = rows.astype(np.int32)
+        self.labels = sorted(labels[code] for code in present if labels[code])
+
+    def _pack(self, rows):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def select(self, labels):
+        """Packed bitmap of the rows having any of labels."""
+        codes = [self.codes[label] for label in labels if label in self.codes]
+        sparse = [self.positions[code] for code in codes if code in self.positions]
+        bits = self._pack(np.concatenate(sparse)) if sparse else np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for code in codes:
+            if code in self.bitmaps:
+                bits |= self.bitmaps[code]
+        return bits
+
+def _dataset_codes(sponsors):
+    """Return {dimension: (codes, {code: label})} for the shared dataset.
+
+    Codes stored by the pipeline are used when every row has them. A
+    database from before they were stored is coded in memory instead.
+    """
+    if all(column in sponsors and sponsors[column].notna().all() for column in CODE_COLUMNS.values()):
+        conn = get_connection()
+        labels = pd.read_sql("SELECT dimension, code, value FROM register_codes", conn)
+        conn.close()
+        return {
+            dimension: (
+                sponsors[column].to_numpy(dtype=np.int64),
+                dict(zip(*labels.loc[labels['dimension'] == dimension, ['code', 'value']].to_numpy().T))
+            )
+            for dimension, column in CODE_COLUMNS.items()
+        }
+
+    values = code_values(sponsors)
+    coded = {}
+    for dimension in CODE_COLUMNS:
+        codes, uniques = pd.factorize(values[dimension])
+        coded[dimension] = (codes.astype(np.int64), dict(enumerate(uniques)))
+    return coded
+
+def get_shared_sponsors():
+    """Get the process-wide sponsor dataset, rebuilding it when the data changes.
+
+    All sessions get the same SponsorDataset: every sponsor sorted newest
+    first with cleaned city names and only SPONSOR_TABLE_COLUMNS, the sorted
+    city, route, worker type and rating options, and a BitmapIndex per coded
+    dimension. Callers must
+    treat it as read-only and keep only filter selections and row positions
+    of their own (see filter_sponsor_rows). It is reloaded only when
+    get_data_version changes.
+    """
+    version = get_data_version()
+    dataset = _shared_dataset.get('dataset')
+    if dataset is not None and dataset.version == version:
+        return dataset
+
+    with _shared_lock:
+        # Another session may have rebuilt it while this one waited
+        dataset = _shared_dataset.get('dataset')
+        if dataset is None or dataset.version != version:
+            sponsors = get_all_sponsors().reset_index(drop=True)
+            indexes = {
+                dimension: BitmapIndex(codes, labels)
+                for dimension, (codes, labels) in _dataset_codes(sponsors).items()
+            }
+            # The other columns are only needed to build the indexes
+            dataset = SponsorDataset(
+                version=version,
+                sponsors=sponsors[SPONSOR_TABLE_COLUMNS],
+                cities=indexes['town_city'].labels,
+                routes=indexes['route'].labels,
+                worker_types=indexes['worker_type'].labels,
+                ratings=indexes['rating'].labels,
+                indexes=indexes,
+            )
+            _shared_dataset['dataset'] = dataset
+    return dataset
+
+def filter_sponsor_rows(dataset, cities=None, routes=None, search=None, worker_types=None, ratings=None):
+    """Return the positions of the dataset's rows matching the Sponsor List filters.
+
+    Values chosen for one dimension are combined with OR and dimensions
+    with AND, by intersecting their bitmaps. The name search then only
+    looks at the rows left. Positions are in the dataset's newest-first
+    order; pass them to sponsor_table for the filtered table.
+    """
+    size = len(dataset.sponsors)
+    selected = None
+    for dimension, labels in (('town_city', cities), ('route', routes),
+                              ('worker_type', worker_types), ('rating', ratings)):
+        if labels:
+            bits = dataset.indexes[dimension].select(labels)
+            selected = bits if selected is None else np.bitwise_and(selected, bits, out=selected)
+
+    rows = np.arange(size) if selected is None else np.flatnonzero(np.unpackbits(selected, count=size))
+    if search:
+        names = dataset.sponsors['organisation_name'].iloc[rows]
+        rows = rows[names.str.contains(search, case=False, na=False).to_numpy()]
+    return rows
+
+def sponsor_table(dataset, rows):
+    """Return the Sponsor List table for rows from filter_sponsor_rows.
+
+    When every row matches, the shared frame itself is returned, so an
+    unfiltered rerun copies nothing.
+    """
+    if len(rows) == len(dataset.sponsors):
+        return dataset.sponsors
+    return dataset.sponsors.iloc[rows]
+
 def get_recent_sponsors(days=30):
     """Get sponsors added in the last X days."""
     conn = get_connection()
@@ -51,42 +284,39 @@ def get_recent_sponsors(days=30):
 
 def get_sponsor_stats():
     """Get basic statistics about the sponsors database."""
-    conn = get_connection()
+    backend = get_backend()
 
     # Total sponsors
-    total = pd.read_sql("SELECT COUNT(*) as count FROM sponsor_register", conn).iloc[0]['count']
+    total = backend.read_sql("SELECT COUNT(*) as count FROM sponsor_register").iloc[0]['count']
 
     # Recent additions (last 30 days)
     cutoff_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-    recent = pd.read_sql(
-        f"SELECT COUNT(*) as count FROM sponsor_register WHERE first_appeared_date >= '{cutoff_date}'",
-        conn
+    recent = backend.read_sql(
+        "SELECT COUNT(*) as count FROM sponsor_register WHERE first_appeared_date >= ?",
+        [cutoff_date]
     ).iloc[0]['count']
 
     # Recent additions (last 7 days)
     cutoff_date_7d = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-    recent_7d = pd.read_sql(
-        f"SELECT COUNT(*) as count FROM sponsor_register WHERE first_appeared_date >= '{cutoff_date_7d}'",
-        conn
+    recent_7d = backend.read_sql(
+        "SELECT COUNT(*) as count FROM sponsor_register WHERE first_appeared_date >= ?",
+        [cutoff_date_7d]
     ).iloc[0]['count']
 
     # Top cities
-    cities_query = pd.read_sql(
-        "SELECT town_city, COUNT(*) as count FROM sponsor_register GROUP BY town_city ORDER BY count DESC LIMIT 10",
-        conn
+    cities_query = backend.read_sql(
+        "SELECT town_city, COUNT(*) as count FROM sponsor_register GROUP BY town_city "
+        "ORDER BY count DESC, town_city NULLS FIRST LIMIT 10"
     )
     # Clean city names before any aggregations
     cities_query['town_city'] = cities_query['town_city'].apply(clean_city_name)
     cities = cities_query.to_dict(orient='records')
 
     # Sponsors by route
-    routes = pd.read_sql(
-        "SELECT route, COUNT(*) as count FROM sponsor_register GROUP BY route ORDER BY count DESC",
-        conn
+    routes = backend.read_sql(
+        "SELECT route, COUNT(*) as count FROM sponsor_register GROUP BY route ORDER BY count DESC, route NULLS FIRST"
     ).to_dict(orient='records')
 
-    conn.close()
-
     return {
         'total_sponsors': total,
         'recent_additions': recent,
@@ -97,13 +327,410 @@ def get_sponsor_stats():
 
 def get_daily_additions():
     """Get the count of daily additions over time."""
-    conn = get_connection()
-
     query = """
     SELECT date, added_count FROM daily_updates
     ORDER BY date
     """
 
-    df = pd.read_sql(query, conn)
+    return get_backend().read_sql(query)
+
+def get_data_version():
+    """Get a version string for the current daily data.
+
+    The version changes whenever the pipeline commits a daily update,
+    including a rerun for a date already logged, so it can be used as a
+    cache key or ETag by readers. It is cached against the database file's
+    modification time to keep repeated calls cheap.
+    """
+    stat = os.stat(DB_PATH)
+    file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _version_cache.get('file_key') == file_key:
+        return _version_cache['version']
+
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT MAX(date), COUNT(*), SUM(added_count), SUM(removed_count) FROM daily_updates"
+    ).fetchone()
+    has_checkpoints = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pipeline_checkpoints'"
+    ).fetchone()
+    committed_at = conn.execute(
+        "SELECT MAX(completed_at) FROM pipeline_checkpoints WHERE stage = 'commit'"
+    ).fetchone()[0] if has_checkpoints else None
+    conn.close()
+
+    latest_date, runs, added, removed = row
+    version = f"{latest_date or 'empty'}.{runs}.{added or 0}.{removed or 0}"
+    if committed_at:
+        # A same-date rerun can change details without changing the counts
+        version = f"{version}.{committed_at.replace(' ', 'T')}"
+    _version_cache['file_key'] = file_key
+    _version_cache['version'] = version
+    return version
+
+def search_sponsors(search=None, cities=None, routes=None, since=None, until=None, after=None, limit=100):
+    """Search sponsors with keyset pagination.
+
+    Results are ordered newest first by first_appeared_date, then by
+    organisation_name and route. Pass the (first_appeared_date,
+    organisation_name, route) of the last row of a page as `after` to get the
+    next page.
+    """
+    conditions = []
+    params = []
+
+    if search:
+        conditions.append("organisation_name LIKE ?")
+        params.append(f"%{search}%")
+    if cities:
+        conditions.append(f"town_city IN ({','.join('?' * len(cities))})")
+        params.extend(cities)
+    if routes:
+        conditions.append(f"route IN ({','.join('?' * len(routes))})")
+        params.extend(routes)
+    if since:
+        conditions.append("first_appeared_date >= ?")
+        params.append(since)
+    if until:
+        conditions.append("first_appeared_date <= ?")
+        params.append(until)
+    if after:
+        after_date, after_name, after_route = after
+        conditions.append("""(first_appeared_date < ?
+             OR (first_appeared_date = ? AND organisation_name > ?)
+             OR (first_appeared_date = ? AND organisation_name = ? AND route > ?))""")
+        params.extend([after_date, after_date, after_name, after_date, after_name, after_route])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # The register's code columns are internal to filtering and not listed
+    query = f"""
+    SELECT organisation_name, town_city, county, type_rating, route,
+           first_appeared_date, last_updated_date
+    FROM sponsor_register
+    {where}
+    ORDER BY first_appeared_date DESC, organisation_name, route
+    LIMIT ?
+    """
+    params.append(limit)
+
+    conn = get_connection()
+    df = pd.read_sql(query, conn, params=params)
+    conn.close()
+    df['town_city'] = df['town_city'].apply(clean_city_name)
+    return df
+
+def iter_sponsor_chunks(cities=None, routes=None, search=None, worker_types=None, ratings=None, chunksize=20000):
+    """Yield sponsors matching the Sponsor List filters in chunks, newest first.
+
+    Matches the page's filtering: cities are compared after clean_city_name,
+    worker types and ratings as parsed from type_rating, and search is a
+    case-insensitive pattern match on organisation_name. Only one chunk is
+    held in memory at a time.
+    """
+    params = []
+    where = ""
+    if routes:
+        where = f"WHERE route IN ({','.join('?' * len(routes))})"
+        params.extend(routes)
+
+    query = f"""
+    SELECT * FROM sponsor_register
+    {where}
+    ORDER BY first_appeared_date DESC
+    """
+
+    conn = get_connection()
+    try:
+        for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize):
+            chunk['town_city'] = chunk['town_city'].apply(clean_city_name)
+            if cities:
+                chunk = chunk[chunk['town_city'].isin(cities)]
+            if worker_types or ratings:
+                types = parse_type_rating(chunk['type_rating'])
+                keep = np.ones(len(chunk), dtype=bool)
+                if worker_types:
+                    keep &= types['worker_type'].isin(worker_types).to_numpy()
+                if ratings:
+                    keep &= types['rating'].isin(ratings).to_numpy()
+                chunk = chunk[keep]
+            if search:
+                chunk = chunk[chunk['organisation_name'].str.contains(search, case=False, na=False)]
+            if not chunk.empty:
+                yield chunk
+    finally:
+        conn.close()
+
+def get_daily_changes(since=None, until=None):
+    """Get the daily change feed of added and removed counts."""
+    conditions = []
+    params = []
+    if since:
+        conditions.append("date >= ?")
+        params.append(since)
+    if until:
+        conditions.append("date <= ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = f"""
+    SELECT date, added_count, removed_count FROM daily_updates
+    {where}
+    ORDER BY date DESC
+    """
+
+    return get_backend().read_sql(query, params)
+
+def get_sponsor_changes(since=None, until=None, change_types=None, after=None, limit=None):
+    """Get added, removed and changed licences between two dates, newest first.
+
+    Changes are kept in monthly history partitions and only the partitions
+    that overlap the dates are opened. after and limit page through one
+    date's changes as for read_changes.
+    """
+    return read_changes(history_dir(DB_PATH), since, until, change_types, after, limit)
+
+def get_organisation_profile(organisation_name):
+    """Get the profile and licence history of one organisation.
+
+    Both tables are read by organisation_name, their primary key. Returns
+    None if the organisation is unknown.
+    """
+    conn = get_connection()
+    row = conn.execute("""
+    SELECT organisation_name, town_city, county, first_seen_date, current_routes, removed_date
+    FROM organisation_profiles
+    WHERE organisation_name = ?
+    """, (organisation_name,)).fetchone()
+
+    if row is None:
+        conn.close()
+        return None
+
+    events = pd.read_sql("""
+    SELECT date, event, route, type_rating, previous_type_rating
+    FROM organisation_events
+    WHERE organisation_name = ?
+    ORDER BY date DESC, route
+    """, conn, params=(organisation_name,))
+
+    # Active organisations were last seen on the latest run; removed ones on
+    # the run before their removal
+    name, town_city, county, first_seen, current_routes, removed_date = row
+    if removed_date:
+        last_seen = conn.execute(
+            "SELECT MAX(date) FROM daily_updates WHERE date < ?", (removed_date,)
+        ).fetchone()[0]
+    else:
+        last_seen = conn.execute("SELECT MAX(date) FROM daily_updates").fetchone()[0]
     conn.close()
-    return df
\ No newline at end of file
+
+    return {
+        'organisation_name': name,
+        'town_city': clean_city_name(town_city),
+        'county': county,
+        'first_seen_date': first_seen,
+        'last_seen_date': last_seen or first_seen,
+        'current_routes': json.loads(current_routes or '[]'),
+        'removed_date': removed_date,
+        'events': events
+    }
+
+def _dimension_filter(cities=None, routes=None):
+    """SQL conditions and parameters for canonical city and route filters."""
+    conditions = []
+    params = []
+    if cities:
+        conditions.append(f"town_city IN ({','.join('?' * len(cities))})")
+        params.extend(cities)
+    if routes:
+        conditions.append(f"route IN ({','.join('?' * len(routes))})")
+        params.extend(routes)
+    return conditions, params
+
+def query_sponsor_cube(cities=None, routes=None, since=None, until=None, group_by=()):
+    """Count current licences from sponsor_cube for any filter combination.
+
+    Cities are canonical names as returned by clean_city_name. group_by takes
+    any of first_appeared_date, town_city and route; with no grouping the
+    result is a single total row. The cost depends on the number of cube
+    cells, not the number of register rows.
+    """
+    conditions, params = _dimension_filter(cities, routes)
+    if since:
+        conditions.append("first_appeared_date >= ?")
+        params.append(since)
+    if until:
+        conditions.append("first_appeared_date <= ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    columns = ', '.join(group_by)
+    query = f"""
+    SELECT {columns + ', ' if columns else ''}CAST(COALESCE(SUM(sponsor_count), 0) AS BIGINT) as count
+    FROM sponsor_cube
+    {where}
+    {f'GROUP BY {columns} ORDER BY count DESC, {columns}' if columns else ''}
+    """
+
+    return get_backend().read_sql(query, params)
+
+def get_cube_stats(cities=None, routes=None, days=None, top_n=10):
+    """Get dashboard statistics for a city and route filter from sponsor_cube.
+
+    Returns the same keys as get_sponsor_stats, counting current licences.
+    Top cities are limited to licences first seen in the last `days` days
+    when given.
+    """
+    def cutoff(window):
+        return (datetime.now() - timedelta(days=window)).strftime("%Y-%m-%d")
+
+    def total(since=None):
+        return int(query_sponsor_cube(cities, routes, since=since).iloc[0]['count'])
+
+    top_cities = query_sponsor_cube(
+        cities, routes, since=cutoff(days) if days else None, group_by=['town_city']
+    )
+    top_cities = top_cities[top_cities['town_city'] != ''].head(top_n)
+
+    return {
+        'total_sponsors': total(),
+        'recent_additions': total(cutoff(30)),
+        'recent_additions_7d': total(cutoff(7)),
+        'top_cities': top_cities.to_dict(orient='records'),
+        'sponsor_routes': query_sponsor_cube(cities, routes, group_by=['route']).to_dict(orient='records')
+    }
+
+def _month_index(months):
+    """Convert 'YYYY-MM' strings to a running month number."""
+    months = pd.Series(months, dtype=object).astype(str)
+    return (months.str[:4].astype(int) * 12 + months.str[5:7].astype(int) - 1).to_numpy()
+
+def get_licence_spells(cities=None, routes=None):
+    """Get licence counts by month first seen, month removed, route and city.
+
+    Current licences come from sponsor_cube and have no removal month;
+    removed ones come from licence_removals. Both tables hold counts, so the
+    result grows with the number of months rather than licences. Also
+    returns the month of the latest run, where current licences are censored,
+    or None before the first run.
+    """
+    conditions, params = _dimension_filter(cities, routes)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    backend = get_backend()
+    spells = backend.read_sql(f"""
+    SELECT substr(first_appeared_date, 1, 7) as first_month, NULL as removed_month,
+           route, town_city, CAST(SUM(sponsor_count) AS BIGINT) as count
+    FROM sponsor_cube
+    {where}
+    GROUP BY first_month, route, town_city
+    UNION ALL
+    SELECT first_month, removed_month, route, town_city, licence_count as count
+    FROM licence_removals
+    {where}
+    ORDER BY first_month, removed_month NULLS FIRST, route, town_city
+    """, params * 2)
+    latest = backend.read_sql("SELECT MAX(date) as latest FROM daily_updates").iloc[0]['latest']
+    latest = latest if isinstance(latest, str) else None
+    return spells, latest[:7] if latest else None
+
+def _lifetimes(spells, latest_month):
+    """Whole months each spell lasted, and whether it ended in a removal."""
+    removed = spells['removed_month'].notna().to_numpy()
+    end = np.where(removed, spells['removed_month'].fillna(latest_month), latest_month)
+    durations = _month_index(end) - _month_index(spells['first_month'])
+    return np.maximum(durations, 0), removed, spells['count'].to_numpy(dtype=float)
+
+def _survival_curves(durations, removed, weights, groups, n_groups):
+    """Kaplan-Meier survival by month for every group at once.
+
+    Returns (survival, at_risk) arrays of shape (n_groups, months).
+    """
+    horizon = int(durations.max()) + 1
+    cells = groups * horizon + durations
+    size = n_groups * horizon
+    exits = np.bincount(cells, weights=weights, minlength=size).reshape(n_groups, horizon)
+    ends = np.bincount(cells, weights=weights * removed, minlength=size).reshape(n_groups, horizon)
+
+    # Licences still at risk at the start of each month
+    at_risk = exits[:, ::-1].cumsum(axis=1)[:, ::-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hazard = np.where(at_risk > 0, ends / at_risk, 0.0)
+    return np.cumprod(1 - hazard, axis=1), at_risk
+
+def get_licence_survival(cities=None, routes=None):
+    """Get the share of licences that survive past each month of their life."""
+    spells, latest_month = get_licence_spells(cities, routes)
+    if spells.empty or latest_month is None:
+        return pd.DataFrame(columns=['months', 'survival', 'at_risk'])
+
+    durations, removed, weights = _lifetimes(spells, latest_month)
+    survival, at_risk = _survival_curves(durations, removed, weights, np.zeros(len(spells), dtype=int), 1)
+    return pd.DataFrame({
+        'months': np.arange(survival.shape[1]),
+        'survival': survival[0],
+        'at_risk': at_risk[0].astype(int),
+    })
+
+def get_median_lifetimes(by='route', cities=None, routes=None):
+    """Get the median licence lifetime in months for each route or city.
+
+    The median is missing where more than half of a group's licences are
+    still active.
+    """
+    if by not in ('route', 'town_city'):
+        raise ValueError(f"Unsupported grouping: {by}")
+
+    spells, latest_month = get_licence_spells(cities, routes)
+    spells = spells[spells[by] != '']
+    if spells.empty or latest_month is None:
+        return pd.DataFrame(columns=[by, 'median_months', 'licences', 'removed'])
+
+    codes, names = pd.factorize(spells[by])
+    durations, removed, weights = _lifetimes(spells, latest_month)
+    survival, _ = _survival_curves(durations, removed, weights, codes, len(names))
+
+    reached = survival <= 0.5
+    medians = np.where(reached.any(axis=1), reached.argmax(axis=1), np.nan)
+    return pd.DataFrame({
+        by: names,
+        'median_months': medians,
+        'licences': np.bincount(codes, weights=weights, minlength=len(names)).astype(int),
+        'removed': np.bincount(codes, weights=weights * removed, minlength=len(names)).astype(int),
+    }).sort_values([by]).reset_index(drop=True)
+
+def get_monthly_churn(cities=None, routes=None):
+    """Get the monthly churn rate of licences.
+
+    A month's churn rate is the licences removed in it divided by the
+    licences exposed to removal in it: those active at its start plus those
+    first seen during it. Licences both first seen and removed in the month
+    count in both, so the rate never exceeds 1.
+    """
+    spells, latest_month = get_licence_spells(cities, routes)
+    if spells.empty or latest_month is None:
+        return pd.DataFrame(columns=['month', 'active_start', 'added', 'removed', 'churn_rate'])
+
+    first = _month_index(spells['first_month'])
+    removed = spells['removed_month'].notna().to_numpy()
+    weights = spells['count'].to_numpy(dtype=float)
+    start = first.min()
+    months = _month_index([latest_month])[0] - start + 1
+
+    starts = np.bincount(first - start, weights=weights, minlength=months)
+    ends = np.bincount(
+        _month_index(spells.loc[removed, 'removed_month']) - start, weights=weights[removed], minlength=months
+    )
+    active_start = np.cumsum(starts) - starts - (np.cumsum(ends) - ends)
+    exposed = active_start + starts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        churn = np.where(exposed > 0, ends / exposed, np.nan)
+
+    month_numbers = start + np.arange(months)
+    return pd.DataFrame({
+        'month': [f"{year:04d}-{month + 1:02d}" for year, month in zip(month_numbers // 12, month_numbers % 12)],
+        'active_start': active_start.astype(int),
+        'added': starts.astype(int),
+        'removed': ends.astype(int),
+        'churn_rate': churn,
+    })
@@ -0,0 +1,303 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from sponsor_analytics import (
+    get_daily_changes,
+    get_data_version,
+    get_sponsor_changes,
+    get_sponsor_stats,
+    search_sponsors,
+)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 1024
+RESPONSE_CACHE_SIZE = 2048
+
+class ApiError(Exception):
+    """An error that maps directly to an HTTP status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class ResponseCache:
+    """Small thread-safe LRU cache of encoded response bodies."""
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+_cache = ResponseCache()
+
+# Keyset columns for paging sponsors and one day's changes
+SPONSOR_KEY = ['first_appeared_date', 'organisation_name', 'route']
+CHANGE_KEY = ['change_type', 'organisation_name', 'route']
+
+def encode_cursor(row, columns=SPONSOR_KEY):
+    """Encode the keyset position of a row as an opaque cursor."""
+    key = [row[column] for column in columns]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ApiError(400, "Invalid cursor")
+    if not isinstance(key, list) or len(key) != 3 or not all(isinstance(value, str) for value in key):
+        raise ApiError(400, "Invalid cursor")
+    return tuple(key)
+
+def _single(params, name):
+    values = params.get(name)
+    return values[-1] if values else None
+
+def _date(value):
+    """Parse a YYYY-MM-DD path segment."""
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        parsed = None
+    if parsed != value:
+        raise ApiError(400, "date must be YYYY-MM-DD")
+    return parsed
+
+def _page_size(params):
+    limit = _single(params, 'limit')
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ApiError(400, "limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+def _sponsor_page(params, since=None, until=None):
+    limit = _page_size(params)
+    cursor = _single(params, 'cursor')
+
+    # Fetch one extra row to know whether another page exists
+    df = search_sponsors(
+        search=_single(params, 'q'),
+        cities=params.get('city'),
+        routes=params.get('route'),
+        since=since or _single(params, 'since'),
+        until=until or _single(params, 'until'),
+        after=decode_cursor(cursor) if cursor else None,
+        limit=limit + 1
+    )
+    records = df.head(limit).to_dict(orient='records')
+    next_cursor = encode_cursor(records[-1]) if len(df) > limit else None
+
+    return {'data': records, 'next_cursor': next_cursor}
+
+def handle_sponsors(params):
+    return _sponsor_page(params)
+
+def handle_stats(params):
+    return get_sponsor_stats()
+
+def handle_changes(params):
+    df = get_daily_changes(since=_single(params, 'since'), until=_single(params, 'until'))
+    return {'data': df.to_dict(orient='records')}
+
+def handle_changes_for_date(params, date):
+    """Page through the licences added, removed and changed on one date.
+
+    Changes are read from the date's history partition, ordered by
+    change_type, organisation_name and route.
+    """
+    limit = _page_size(params)
+    cursor = _single(params, 'cursor')
+
+    # Fetch one extra row to know whether another page exists
+    date = _date(date)
+    changes = get_sponsor_changes(
+        date, date, params.get('change_type'),
+        after=decode_cursor(cursor) if cursor else None,
+        limit=limit + 1
+    )
+
+    page = changes.head(limit).astype(object)
+    records = page.where(page.notna(), None).to_dict(orient='records')
+    next_cursor = encode_cursor(records[-1], CHANGE_KEY) if len(changes) > limit else None
+
+    return {'data': records, 'next_cursor': next_cursor}
+
+def route_request(path, params):
+    """Dispatch a request path to its handler and return the JSON payload."""
+    parts = [part for part in path.split('/') if part]
+
+    if parts == ['sponsors']:
+        return handle_sponsors(params)
+    if parts == ['stats']:
+        return handle_stats(params)
+    if parts == ['changes']:
+        return handle_changes(params)
+    if len(parts) == 2 and parts[0] == 'changes':
+        return handle_changes_for_date(params, parts[1])
+    if parts == ['version']:
+        return {'version': get_data_version()}
+
+    raise ApiError(404, "Not found")
+
+def _json_default(value):
+    # numpy scalars returned by pandas aggregates
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows a gzip body.
+
+    Codings with q=0 are refused; gzip may also be allowed by '*'.
+    """
+    qualities = {}
+    for part in (accept_encoding or '').split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+def make_etag(version, target, encoding=None):
+    """Strong ETag for a response; each content coding gets its own tag."""
+    digest = hashlib.sha1(f"{version}|{target}".encode('utf-8')).hexdigest()[:20]
+    suffix = '-gz' if encoding == 'gzip' else ''
+    return f'"{digest}{suffix}"'
+
+class SponsorApiHandler(BaseHTTPRequestHandler):
+    """Read-only JSON API over sponsor_analytics."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without TCP_NODELAY the body of
+    # every response on a kept-alive connection waits for a delayed ACK
+    disable_nagle_algorithm = True
+    server_version = 'SponsorAPI/1.0'
+    quiet = False
+
+    def do_GET(self):
+        try:
+            version = get_data_version()
+        except Exception as e:
+            self._send_error(503, f"Data not available: {str(e)}")
+            return
+
+        # Either coding of the current data revalidates; the 304 echoes the
+        # tag the client holds
+        if_none_match = self.headers.get('If-None-Match', '')
+        for encoding in (None, 'gzip'):
+            etag = make_etag(version, self.path, encoding)
+            if etag in if_none_match:
+                self._send(304, etag=etag)
+                return
+
+        use_gzip = accepts_gzip(self.headers.get('Accept-Encoding'))
+        cache_key = (version, self.path, use_gzip)
+        cached = _cache.get(cache_key)
+        if cached is not None:
+            body, encoding = cached
+            self._send(200, body, etag=make_etag(version, self.path, encoding), encoding=encoding)
+            return
+
+        url = urlsplit(self.path)
+        try:
+            payload = route_request(url.path, parse_qs(url.query))
+        except ApiError as e:
+            self._send_error(e.status, e.message)
+            return
+        except Exception as e:
+            self._send_error(500, f"Internal error: {str(e)}")
+            return
+
+        body = json.dumps(payload, default=_json_default, separators=(',', ':')).encode('utf-8')
+        encoding = None
+        if use_gzip and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            encoding = 'gzip'
+
+        _cache.put(cache_key, (body, encoding))
+        self._send(200, body, etag=make_etag(version, self.path, encoding), encoding=encoding)
+
+    def _send_error(self, status, message):
+        body = json.dumps({'error': message}).encode('utf-8')
+        self._send(status, body)
+
+    def _send(self, status, body=b'', etag=None, encoding=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def create_server(host='127.0.0.1', port=8000, quiet=False):
+    """Create the API server without starting it."""
+    handler = type('Handler', (SponsorApiHandler,), {'quiet': quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def run_server(host='127.0.0.1', port=8000, quiet=False):
+    """Serve the API until interrupted."""
+    server = create_server(host, port, quiet)
+    print(f"Serving sponsor API on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only HTTP JSON API for the sponsor register.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--quiet', action='store_true', help="Disable per-request logging")
+    args = parser.parse_args()
+    run_server(args.host, args.port, args.quiet)
@@ -0,0 +1,107 @@
+import re
+
+import pandas as pd
+
+# Dimensions stored as integer codes on sponsor_register, and the column
+# holding each one's code. Code labels are kept in register_codes.
+CODE_COLUMNS = {
+    'route': 'route_code',
+    'town_city': 'city_code',
+    'worker_type': 'worker_type_code',
+    'rating': 'rating_code',
+}
+
+# The one grammar for Type & Rating values, used for parsing and validation.
+# 'Worker (A rating)' -> worker type 'Worker', rating 'A rating'. The
+# rating runs to the closing bracket that ends the value, e.g. 'A (SME+)'.
+TYPE_RATING_PATTERN = r'^\s*(?P<worker_type>[^(]*)\((?P<rating>.*)\)\s*$'
+TYPE_RATING = re.compile(TYPE_RATING_PATTERN)
+
+# Dropped from the end of a rating: 'A rating' -> 'A'
+RATING_SUFFIX_PATTERN = r'\s+rating$'
+
+def clean_city_name(city):
+    """Standardize city names to title case and remove extra characters"""
+    if pd.isna(city) or not isinstance(city, str):
+        return city
+    # Remove common punctuation and extra spaces
+    cleaned = re.sub(r'[,.]', '', city.strip())
+    # Convert to title case
+    cleaned = cleaned.title()
+    return cleaned
+
+def parse_rating(type_rating):
+    """Extract the rating from a Type & Rating value, e.g. 'Worker (A rating)' -> 'A'."""
+    match = TYPE_RATING.match(type_rating) if isinstance(type_rating, str) else None
+    if match is None:
+        return ''
+    return re.sub(RATING_SUFFIX_PATTERN, '', match['rating'].strip(), flags=re.IGNORECASE)
+
+def parse_type_rating(type_rating):
+    """Split a Series of Type & Rating values into worker_type and rating columns.
+
+    Ratings are parsed as by parse_rating. Values that do not match
+    TYPE_RATING_PATTERN give empty strings.
+    """
+    parts = pd.Series(type_rating, dtype=object).str.extract(TYPE_RATING_PATTERN).fillna('')
+    return pd.DataFrame({
+        'worker_type': parts['worker_type'].str.strip(),
+        'rating': parts['rating'].str.strip().str.replace(RATING_SUFFIX_PATTERN, '', case=False, regex=True),
+    })
+
+def code_values(register):
+    """Value of each coded dimension for register rows, with cities cleaned."""
+    types = parse_type_rating(register['type_rating'])
+    return pd.DataFrame({
+        'route': register['route'].fillna('').to_numpy(),
+        'town_city': register['town_city'].map(clean_city_name).fillna('').to_numpy(),
+        'worker_type': types['worker_type'].to_numpy(),
+        'rating': types['rating'].to_numpy(),
+    })
+
+def assign_codes(conn, values):
+    """Return the code columns for a frame of dimension values.
+
+    Values not seen before are given the next free code of their dimension
+    in register_codes, so existing codes never change.
+    """
+    codes = {}
+    for dimension, column in CODE_COLUMNS.items():
+        known = dict(conn.execute(
+            "SELECT value, code FROM register_codes WHERE dimension = ?", (dimension,)
+        ).fetchall())
+        unseen = sorted(set(values[dimension].unique()) - known.keys())
+        next_code = max(known.values(), default=-1) + 1
+        added = {value: next_code + offset for offset, value in enumerate(unseen)}
+        conn.executemany(
+            "INSERT INTO register_codes (dimension, code, value) VALUES (?, ?, ?)",
+            [(dimension, code, value) for value, code in added.items()]
+        )
+        known.update(added)
+        codes[column] = values[dimension].map(known).astype('int64').to_numpy()
+    return pd.DataFrame(codes)
+
+def update_register_codes(conn):
+    """Fill in the code columns of register rows that have none.
+
+    Inserted rows and rows whose details were updated are left without
+    codes by the pipeline, so only those are parsed. The first run on a
+    database from before codes were stored codes every row.
+    """
+    rows = pd.read_sql("""
+    SELECT organisation_name, route, town_city, type_rating
+    FROM sponsor_register
+    WHERE route_code IS NULL
+    """, conn)
+    if rows.empty:
+        return 0
+
+    codes = assign_codes(conn, code_values(rows))
+    columns = list(CODE_COLUMNS.values())
+    conn.executemany(
+        f"UPDATE sponsor_register SET {', '.join(f'{column} = ?' for column in columns)} "
+        "WHERE organisation_name = ? AND route = ?",
+        zip(*(codes[column].tolist() for column in columns), rows['organisation_name'], rows['route'])
+    )
+    print(f"Coded {len(rows)} register rows")
+    return len(rows)
@@ -0,0 +1,72 @@
+import pandas as pd
+
+from sponsor_codes import clean_city_name
+
+CUBE_DIMENSIONS = ['first_appeared_date', 'town_city', 'route']
+
+def _cells(df, sign):
+    """Count rows per cube cell, with the canonical city as the city key."""
+    cells = pd.DataFrame({
+        'first_appeared_date': df['first_appeared_date'].to_numpy(),
+        'town_city': df['town_city'].map(clean_city_name).fillna('').to_numpy(),
+        'route': df['route'].to_numpy(),
+    })
+    return cells.groupby(CUBE_DIMENSIONS).size().mul(sign).rename('sponsor_count').reset_index()
+
+def rebuild_sponsor_cube(conn):
+    """Build sponsor_cube from scratch from the current rows of sponsor_register."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM sponsor_cube")
+
+    current = pd.read_sql("""
+    SELECT first_appeared_date, town_city, route FROM sponsor_register
+    WHERE last_updated_date = (SELECT MAX(last_updated_date) FROM sponsor_register)
+    """, conn)
+    if current.empty:
+        return 0
+
+    cells = _cells(current, 1)
+    cursor.executemany(
+        "INSERT INTO sponsor_cube (first_appeared_date, town_city, route, sponsor_count) VALUES (?, ?, ?, ?)",
+        cells.itertuples(index=False, name=None)
+    )
+    print(f"Built sponsor cube with {len(cells)} cells")
+    return len(cells)
+
+def update_sponsor_cube(conn, delta, today):
+    """Apply one day's added, removed and changed rows to sponsor_cube.
+
+    Added licences count +1 in their cell and removed ones -1. A changed
+    licence only moves if its canonical city changed.
+    """
+    cursor = conn.cursor()
+    if cursor.execute("SELECT 1 FROM sponsor_cube LIMIT 1").fetchone() is None:
+        # An empty cube has no cells for today's removals to decrement, so
+        # count the current licences instead
+        rebuild_sponsor_cube(conn)
+        return
+
+    changed = delta['changed']
+    moved = changed[
+        changed['town_city'].map(clean_city_name).fillna('')
+        != changed['town_city_previous'].map(clean_city_name).fillna('')
+    ]
+    parts = [
+        _cells(delta['added'].assign(first_appeared_date=delta['added']['first_appeared_date'].fillna(today)), 1),
+        _cells(delta['removed'], -1),
+        _cells(moved, 1),
+        _cells(moved.assign(town_city=moved['town_city_previous']), -1),
+    ]
+    cells = pd.concat(parts).groupby(CUBE_DIMENSIONS)['sponsor_count'].sum().reset_index()
+    cells = cells[cells['sponsor_count'] != 0]
+
+    cursor.executemany("""
+    INSERT INTO sponsor_cube (first_appeared_date, town_city, route, sponsor_count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(first_appeared_date, town_city, route) DO UPDATE SET
+        sponsor_count = sponsor_count + excluded.sponsor_count
+    """, [(date, city, route, int(count)) for date, city, route, count in cells.itertuples(index=False, name=None)])
+    cursor.execute("DELETE FROM sponsor_cube WHERE sponsor_count <= 0")
+
+    if len(cells):
+        print(f"Updated {len(cells)} sponsor cube cells")
@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Positional row indices into the new and existing datasets
+KeyDiff = namedtuple('KeyDiff', ['added', 'removed', 'retained_new', 'retained_old'])
+
+def encode_keys(names, routes, other_names, other_routes):
+    """Encode the (organisation_name, route) pairs of two datasets as int64 keys.
+
+    Names and routes are factorized jointly over both datasets, so a pair
+    gets the same key in either one and different pairs never share a key.
+    Returns (keys, other_keys).
+    """
+    name_codes, _ = pd.factorize(pd.concat([pd.Series(names), pd.Series(other_names)], ignore_index=True),
+                                 use_na_sentinel=False)
+    route_codes, route_values = pd.factorize(pd.concat([pd.Series(routes), pd.Series(other_routes)], ignore_index=True),
+                                             use_na_sentinel=False)
+    keys = name_codes.astype(np.int64) * max(len(route_values), 1) + route_codes
+    return keys[:len(names)], keys[len(names):]
+
+def _members(sorted_keys, sorted_candidates):
+    """Positions in sorted_keys for each candidate, and whether it was found."""
+    positions = np.searchsorted(sorted_keys, sorted_candidates)
+    if len(sorted_keys) == 0:
+        return positions, np.zeros(len(sorted_candidates), dtype=bool)
+    clipped = np.minimum(positions, len(sorted_keys) - 1)
+    return clipped, sorted_keys[clipped] == sorted_candidates
+
+def diff_keys(new_keys, old_keys):
+    """Compare new and existing keys with a sorted merge.
+
+    Returns a KeyDiff of positional indices: rows only in the new data, rows
+    only in the existing data, and matching (new, existing) pairs for rows in
+    both. Every index array is in ascending row order.
+    """
+    new_order = np.argsort(new_keys)
+    old_order = np.argsort(old_keys)
+    new_sorted = new_keys[new_order]
+    old_sorted = old_keys[old_order]
+
+    old_positions, in_old = _members(old_sorted, new_sorted)
+    _, in_new = _members(new_sorted, old_sorted)
+
+    # Scatter the matches back to row order instead of sorting again
+    match = np.full(len(new_keys), -1, dtype=np.int64)
+    match[new_order[in_old]] = old_order[old_positions[in_old]]
+    still_present = np.zeros(len(old_keys), dtype=bool)
+    still_present[old_order[in_new]] = True
+
+    retained_new = np.flatnonzero(match >= 0)
+    return KeyDiff(
+        added=np.flatnonzero(match < 0),
+        removed=np.flatnonzero(~still_present),
+        retained_new=retained_new,
+        retained_old=match[retained_new],
+    )
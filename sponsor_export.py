@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+from sponsor_analytics import iter_sponsor_chunks
+
+EXPORT_COLUMNS = ['organisation_name', 'town_city', 'county', 'type_rating', 'route', 'first_appeared_date']
+
+EXPORT_FORMATS = {
+    'csv': {'extension': 'csv', 'mime': 'text/csv'},
+    'parquet': {'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+def write_csv(chunks, file):
+    """Append each chunk to a CSV file, writing the header once."""
+    header = True
+    for chunk in chunks:
+        chunk[EXPORT_COLUMNS].to_csv(file, header=header, index=False)
+        header = False
+    if header:
+        file.write((','.join(EXPORT_COLUMNS) + '\n').encode('utf-8'))
+
+def write_parquet(chunks, file):
+    """Write each chunk as a row group of a single Parquet file."""
+    # pyarrow is installed with streamlit; only needed for columnar exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(col, pa.string()) for col in EXPORT_COLUMNS])
+    with pq.ParquetWriter(file, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk[EXPORT_COLUMNS], schema=schema, preserve_index=False))
+
+def export_sponsors(export_format, cities=None, routes=None, search=None, worker_types=None, ratings=None):
+    """Stream filtered sponsors into a temporary file and return it open for reading.
+
+    Rows go from the database to the file one chunk at a time, so memory use
+    does not grow with the size of the export.
+    """
+    writers = {'csv': write_csv, 'parquet': write_parquet}
+    if export_format not in writers:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    fd, path = tempfile.mkstemp(suffix=f".{EXPORT_FORMATS[export_format]['extension']}")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            writers[export_format](iter_sponsor_chunks(cities, routes, search, worker_types, ratings), file)
+        export_file = open(path, 'rb')
+    finally:
+        # The open handle keeps the data readable after the path is gone
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return export_file
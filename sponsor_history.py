@@ -0,0 +1,279 @@
+import os
+import shutil
+import sqlite3
+import stat
+
+import numpy as np
+import pandas as pd
+
+from db_utils import DB_PATH
+
+# SQLite attaches at most 10 databases to one connection by default
+MAX_ATTACHED = 10
+
+# PRAGMA user_version of a partition that has been compacted. It survives a
+# git checkout, which does not keep the read-only file mode.
+COMPACTED_VERSION = 1
+
+# Left in a staged history directory when the live one already holds
+# partitions. Compacted ones are not staged, so without it a staged copy of
+# fully compacted history would look empty and be backfilled again.
+STAGED_MARKER = '.staged'
+
+HISTORY_COLUMNS = [
+    'date', 'change_type', 'organisation_name', 'route',
+    'town_city', 'county', 'type_rating', 'previous_type_rating'
+]
+
+def history_dir(db_path=DB_PATH):
+    """Directory holding the monthly change history next to the database."""
+    return os.path.join(os.path.dirname(db_path) or '.', 'history')
+
+def partition_path(month, directory):
+    """Path of the partition file for a 'YYYY-MM' month."""
+    return os.path.join(directory, f"changes_{month.replace('-', '_')}.db")
+
+def list_partitions(directory):
+    """Return {month: path} for every partition file in directory."""
+    if not os.path.isdir(directory):
+        return {}
+    partitions = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith('changes_') and filename.endswith('.db'):
+            month = filename[len('changes_'):-len('.db')].replace('_', '-')
+            partitions[month] = os.path.join(directory, filename)
+    return partitions
+
+def is_compacted(path):
+    """Whether a partition has been compacted since it was last written."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    return version == COMPACTED_VERSION
+
+def open_partition(path):
+    """Open a partition for writing, creating it if needed.
+
+    A compacted partition is made writable again; it is compacted and locked
+    once more by the next call to compact_partitions.
+    """
+    if os.path.exists(path) and not os.stat(path).st_mode & stat.S_IWUSR:
+        os.chmod(path, 0o644)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 0")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS register_changes(
+                   date DATE,
+                   change_type TEXT,
+                   organisation_name TEXT,
+                   route TEXT,
+                   town_city TEXT,
+                   county TEXT,
+                   type_rating TEXT,
+                   previous_type_rating TEXT,
+                   PRIMARY KEY (date, change_type, organisation_name, route)
+                   ) WITHOUT ROWID
+    ''')
+    return conn
+
+def _write_partition(path, changes, dates):
+    """Replace the given dates in one partition with changes."""
+    conn = open_partition(path)
+    conn.executemany("DELETE FROM register_changes WHERE date = ?", [(date,) for date in dates])
+    conn.executemany(
+        f"INSERT OR REPLACE INTO register_changes ({', '.join(HISTORY_COLUMNS)}) VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})",
+        changes[HISTORY_COLUMNS].astype(object).where(changes[HISTORY_COLUMNS].notna(), None).itertuples(index=False, name=None)
+    )
+    conn.commit()
+    conn.close()
+
+def delta_changes(delta, date):
+    """Flatten a day's delta into history rows."""
+    frames = []
+    for change_type in ('added', 'removed', 'changed'):
+        frame = delta[change_type]
+        previous = frame['type_rating_previous'] if 'type_rating_previous' in frame else None
+        frames.append(pd.DataFrame({
+            'date': date,
+            'change_type': change_type,
+            'organisation_name': frame['organisation_name'].to_numpy(),
+            'route': frame['route'].to_numpy(),
+            'town_city': frame['town_city'].to_numpy(),
+            'county': frame['county'].to_numpy(),
+            'type_rating': frame['type_rating'].to_numpy(),
+            'previous_type_rating': previous.to_numpy() if previous is not None else None,
+        }, columns=HISTORY_COLUMNS))
+    return pd.concat(frames, ignore_index=True)
+
+def removal_dates(conn, last_seen):
+    """Date each licence was removed, given the date it was last seen.
+
+    A licence last seen on one run was removed on the next run.
+    """
+    run_dates = pd.read_sql("SELECT date FROM daily_updates ORDER BY date", conn)['date'].to_numpy(dtype=str)
+    last_seen = np.asarray(last_seen, dtype=str)
+    if len(run_dates) == 0:
+        return last_seen
+    positions = np.searchsorted(run_dates, last_seen, side='right')
+    return np.where(positions < len(run_dates), run_dates[np.minimum(positions, len(run_dates) - 1)], last_seen)
+
+def backfill_history(conn, directory):
+    """Write the history implied by sponsor_register into monthly partitions.
+
+    Each licence gets an added change on its first appearance and, if it is
+    no longer current, a removed change on the run after it was last seen.
+    Details are those last recorded in the register.
+    """
+    register = pd.read_sql("""
+    SELECT organisation_name, route, town_city, county, type_rating,
+           first_appeared_date, last_updated_date
+    FROM sponsor_register
+    """, conn)
+    if register.empty:
+        return 0
+
+    latest = register['last_updated_date'].max()
+    removed = register[register['last_updated_date'] != latest]
+    changes = pd.concat([
+        register.assign(date=register['first_appeared_date'], change_type='added'),
+        removed.assign(date=removal_dates(conn, removed['last_updated_date']), change_type='removed'),
+    ], ignore_index=True).assign(previous_type_rating=None)
+
+    months = changes['date'].str[:7]
+    for month, partition in changes.groupby(months):
+        _write_partition(partition_path(month, directory), partition, partition['date'].unique())
+
+    print(f"Backfilled {len(changes)} changes into {months.nunique()} history partitions")
+    return len(changes)
+
+def write_daily_changes(conn, delta, date, directory):
+    """Record one day's changes in the partition for its month.
+
+    Rerunning a date replaces its changes rather than adding them twice. The
+    first time history is written for an existing register, it is backfilled
+    from the register instead.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if not list_partitions(directory) and not os.path.exists(os.path.join(directory, STAGED_MARKER)):
+        backfill_history(conn, directory)
+        return
+
+    changes = delta_changes(delta, date)
+    _write_partition(partition_path(date[:7], directory), changes, [date])
+    print(f"Recorded {len(changes)} changes in the {date[:7]} history partition")
+
+def compact_partitions(directory, current_month):
+    """Vacuum and lock every partition for a month before current_month.
+
+    Closed months no longer receive daily changes, so they are compacted once
+    and then opened read-only and immutable by readers.
+    """
+    compacted = []
+    for month, path in list_partitions(directory).items():
+        if month >= current_month or is_compacted(path):
+            continue
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute(f"PRAGMA user_version = {COMPACTED_VERSION}")
+        conn.execute("VACUUM")
+        conn.close()
+        os.chmod(path, 0o444)
+        compacted.append(month)
+    if compacted:
+        print(f"Compacted history partitions: {', '.join(compacted)}")
+    return compacted
+
+def stage_history(directory, staging):
+    """Copy the partitions in directory that a run can write to staging.
+
+    Compacted partitions are never written again, so only the others are
+    copied: the current month and any month still waiting to be compacted.
+    With no live history nothing is copied and the run backfills every
+    month into staging. Live files are never opened for writing.
+    """
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+    partitions = list_partitions(directory)
+    for month, path in partitions.items():
+        if not is_compacted(path):
+            shutil.copy2(path, partition_path(month, staging))
+    if partitions:
+        open(os.path.join(staging, STAGED_MARKER), 'w').close()
+    return staging
+
+def swap_in_history(staging, directory):
+    """Move staged partitions over the live ones and remove staging.
+
+    Partitions that were not staged are left as they are. Each file is
+    replaced with an atomic rename, so a reader that has a
+    partition open, including an immutable compacted one, keeps reading the
+    file it opened.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for month, path in list_partitions(staging).items():
+        os.replace(path, partition_path(month, directory))
+    shutil.rmtree(staging)
+
+def partitions_between(directory, since=None, until=None):
+    """Return {month: path} for partitions that can hold dates in [since, until]."""
+    return {
+        month: path for month, path in list_partitions(directory).items()
+        if (since is None or month >= since[:7]) and (until is None or month <= until[:7])
+    }
+
+def partition_uri(path):
+    """Read-only URI for a partition; compacted partitions are also immutable."""
+    flags = 'mode=ro&immutable=1' if is_compacted(path) else 'mode=ro'
+    return f"file:{os.path.abspath(path)}?{flags}"
+
+def read_changes(directory, since=None, until=None, change_types=None, after=None, limit=None):
+    """Read changes between two dates from only the partitions that overlap them.
+
+    Partitions are attached to an in-memory connection in batches and
+    queried together with UNION ALL. Pass the (change_type,
+    organisation_name, route) of the last change of a page as `after`, with
+    `limit`, to read one date's changes a page at a time; both are applied
+    in the partition query.
+    """
+    conditions = []
+    params = []
+    if since:
+        conditions.append("date >= ?")
+        params.append(since)
+    if until:
+        conditions.append("date <= ?")
+        params.append(until)
+    if change_types:
+        conditions.append(f"change_type IN ({','.join('?' * len(change_types))})")
+        params.extend(change_types)
+    if after:
+        after_type, after_name, after_route = after
+        conditions.append("""(change_type > ?
+             OR (change_type = ? AND organisation_name > ?)
+             OR (change_type = ? AND organisation_name = ? AND route > ?))""")
+        params.extend([after_type, after_type, after_name, after_type, after_name, after_route])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = ['date', 'change_type', 'organisation_name', 'route']
+    page = "ORDER BY date DESC, change_type, organisation_name, route LIMIT ?" if limit else ""
+
+    paths = list(partitions_between(directory, since, until).values())
+    frames = []
+    for start in range(0, len(paths), MAX_ATTACHED):
+        batch = paths[start:start + MAX_ATTACHED]
+        conn = sqlite3.connect('file::memory:', uri=True)
+        for number, path in enumerate(batch):
+            conn.execute(f"ATTACH DATABASE ? AS p{number}", (partition_uri(path),))
+        query = ' UNION ALL '.join(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM p{number}.register_changes {where}"
+            for number in range(len(batch))
+        )
+        batch_params = params * len(batch) + ([limit] if limit else [])
+        frames.append(pd.read_sql(f"{query} {page}", conn, params=batch_params))
+        conn.close()
+
+    if not frames:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    changes = pd.concat(frames, ignore_index=True)
+    changes = changes.sort_values(order, ascending=[False, True, True, True]).reset_index(drop=True)
+    return changes.head(limit) if limit else changes
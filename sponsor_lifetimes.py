@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from sponsor_codes import clean_city_name
+from sponsor_history import removal_dates
+
+REMOVAL_DIMENSIONS = ['first_month', 'removed_month', 'route', 'town_city']
+
+def _removals(df, removed_dates, sign):
+    """Count licences per (first month, removal month, route, canonical city)."""
+    cells = pd.DataFrame({
+        'first_month': df['first_appeared_date'].astype(str).str[:7].to_numpy(),
+        'removed_month': pd.Series(removed_dates, dtype=object).astype(str).str[:7].to_numpy(),
+        'route': df['route'].to_numpy(),
+        'town_city': df['town_city'].map(clean_city_name).fillna('').to_numpy(),
+    })
+    return cells.groupby(REMOVAL_DIMENSIONS).size().mul(sign).rename('licence_count').reset_index()
+
+def _apply(cursor, cells):
+    cursor.executemany("""
+    INSERT INTO licence_removals (first_month, removed_month, route, town_city, licence_count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(first_month, removed_month, route, town_city) DO UPDATE SET
+        licence_count = licence_count + excluded.licence_count
+    """, [(first, removed, route, city, int(count))
+          for first, removed, route, city, count in cells.itertuples(index=False, name=None)])
+    cursor.execute("DELETE FROM licence_removals WHERE licence_count <= 0")
+
+def rebuild_licence_removals(conn):
+    """Build licence_removals from scratch from the removed rows of sponsor_register."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM licence_removals")
+
+    removed = pd.read_sql("""
+    SELECT first_appeared_date, last_updated_date, route, town_city FROM sponsor_register
+    WHERE last_updated_date < (SELECT MAX(last_updated_date) FROM sponsor_register)
+    """, conn)
+    if removed.empty:
+        return 0
+
+    cells = _removals(removed, removal_dates(conn, removed['last_updated_date']), 1)
+    _apply(cursor, cells)
+    print(f"Built licence removals with {len(cells)} cells")
+    return len(cells)
+
+def update_licence_removals(conn, delta, today):
+    """Apply one day's removals and reinstatements to licence_removals.
+
+    A reinstated licence was not removed after all, so its last removal,
+    found in organisation_events, is taken back out.
+    """
+    cursor = conn.cursor()
+    has_removals = cursor.execute("SELECT 1 FROM licence_removals LIMIT 1").fetchone()
+    has_history = cursor.execute(
+        "SELECT 1 FROM sponsor_register WHERE last_updated_date < ? LIMIT 1", (today,)
+    ).fetchone()
+    if not has_removals and has_history:
+        rebuild_licence_removals(conn)
+        return
+
+    removed = delta['removed']
+    parts = [_removals(removed, [today] * len(removed), 1)]
+
+    added = delta['added']
+    reinstated = added[added['first_appeared_date'].fillna(today) != today]
+    if len(reinstated):
+        removed_dates = [
+            cursor.execute("""
+            SELECT MAX(date) FROM organisation_events
+            WHERE organisation_name = ? AND route = ? AND event = 'removed' AND date < ?
+            """, (name, route, today)).fetchone()[0]
+            for name, route in zip(reinstated['organisation_name'], reinstated['route'])
+        ]
+        known = pd.notna(pd.Series(removed_dates, dtype=object)).to_numpy()
+        parts.append(_removals(reinstated[known], np.asarray(removed_dates, dtype=object)[known], -1))
+
+    cells = pd.concat(parts).groupby(REMOVAL_DIMENSIONS)['licence_count'].sum().reset_index()
+    cells = cells[cells['licence_count'] != 0]
+    _apply(cursor, cells)
+
+    if len(cells):
+        print(f"Updated {len(cells)} licence removal cells")
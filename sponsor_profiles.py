@@ -0,0 +1,133 @@
+import json
+from bisect import bisect_right
+
+def _json_routes(routes):
+    return json.dumps(sorted(set(routes)))
+
+def rebuild_organisation_profiles(conn):
+    """Build the profile and event tables from scratch from sponsor_register.
+
+    Used once when the tables are first introduced; afterwards they are kept
+    up to date from each day's delta by update_organisation_profiles.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM organisation_profiles")
+    cursor.execute("DELETE FROM organisation_events")
+
+    latest = cursor.execute("SELECT MAX(last_updated_date) FROM sponsor_register").fetchone()[0]
+    if latest is None:
+        return 0
+
+    # A licence last seen on one run was removed on the next run
+    run_dates = [date for (date,) in cursor.execute("SELECT date FROM daily_updates ORDER BY date")]
+
+    def removal_date(last_seen):
+        position = bisect_right(run_dates, last_seen)
+        return run_dates[position] if position < len(run_dates) else last_seen
+
+    rows = cursor.execute("""
+    SELECT organisation_name, route, town_city, county, type_rating,
+           first_appeared_date, last_updated_date
+    FROM sponsor_register
+    ORDER BY organisation_name, first_appeared_date
+    """).fetchall()
+
+    profiles = {}
+    events = []
+    for name, route, town_city, county, type_rating, first_appeared, last_updated in rows:
+        profile = profiles.setdefault(name, {
+            'town_city': town_city,
+            'county': county,
+            'first_seen_date': first_appeared,
+            'removed_date': None,
+            'routes': [],
+        })
+        profile['first_seen_date'] = min(profile['first_seen_date'], first_appeared)
+        if last_updated == latest:
+            profile['routes'].append(route)
+            profile['town_city'], profile['county'] = town_city, county
+
+        events.append((name, first_appeared, route, 'added', type_rating, None))
+        if last_updated != latest:
+            removed = removal_date(last_updated)
+            profile['removed_date'] = max(profile['removed_date'] or removed, removed)
+            events.append((name, removed, route, 'removed', type_rating, None))
+
+    cursor.executemany("""
+    INSERT INTO organisation_profiles
+    (organisation_name, town_city, county, first_seen_date, current_routes, removed_date)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (name, p['town_city'], p['county'], p['first_seen_date'], _json_routes(p['routes']),
+         None if p['routes'] else p['removed_date'])
+        for name, p in profiles.items()
+    ])
+    cursor.executemany("""
+    INSERT OR IGNORE INTO organisation_events
+    (organisation_name, date, route, event, type_rating, previous_type_rating)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, events)
+
+    print(f"Built profiles for {len(profiles)} organisations")
+    return len(profiles)
+
+def update_organisation_profiles(conn, delta, today):
+    """Apply one day's added, removed and changed rows to the profile tables.
+
+    Only organisations that appear in the delta are read or written.
+    """
+    cursor = conn.cursor()
+
+    has_profiles = cursor.execute("SELECT 1 FROM organisation_profiles LIMIT 1").fetchone()
+    has_history = cursor.execute(
+        "SELECT 1 FROM sponsor_register WHERE first_appeared_date < ? LIMIT 1", (today,)
+    ).fetchone()
+    if not has_profiles and has_history:
+        # The register predates profiles, so the delta alone would miss every
+        # organisation's earlier events: build them from the whole register
+        rebuild_organisation_profiles(conn)
+        return
+
+    events = []
+    for row in delta['added'].to_dict(orient='records'):
+        events.append((row['organisation_name'], today, row['route'], 'added', row['type_rating'], None))
+    for row in delta['removed'].to_dict(orient='records'):
+        events.append((row['organisation_name'], today, row['route'], 'removed', row['type_rating'], None))
+    for row in delta['changed'].to_dict(orient='records'):
+        if row['type_rating'] != row['type_rating_previous']:
+            events.append((row['organisation_name'], today, row['route'], 'rating_changed',
+                           row['type_rating'], row['type_rating_previous']))
+        if (row['town_city'], row['county']) != (row['town_city_previous'], row['county_previous']):
+            events.append((row['organisation_name'], today, row['route'], 'details_changed',
+                           row['type_rating'], None))
+
+    cursor.executemany("""
+    INSERT OR REPLACE INTO organisation_events
+    (organisation_name, date, route, event, type_rating, previous_type_rating)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, events)
+
+    # Refresh the profile of every organisation touched today from its
+    # current register rows, found by primary key prefix
+    names = sorted({event[0] for event in events})
+    for name in names:
+        current = cursor.execute("""
+        SELECT route, town_city, county FROM sponsor_register
+        WHERE organisation_name = ? AND last_updated_date = ?
+        """, (name, today)).fetchall()
+        routes = [route for route, _, _ in current]
+        town_city, county = (current[0][1], current[0][2]) if current else (None, None)
+
+        cursor.execute("""
+        INSERT INTO organisation_profiles
+        (organisation_name, town_city, county, first_seen_date, current_routes, removed_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(organisation_name) DO UPDATE SET
+            town_city = COALESCE(excluded.town_city, town_city),
+            county = COALESCE(excluded.county, county),
+            current_routes = excluded.current_routes,
+            removed_date = excluded.removed_date
+        """, (name, town_city, county, today, _json_routes(routes), None if routes else today))
+
+    if names:
+        print(f"Updated profiles for {len(names)} organisations")
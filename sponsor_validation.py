@@ -0,0 +1,127 @@
+import pandas as pd
+
+from sponsor_codes import parse_type_rating
+
+# Header published by GOV.UK for the Worker and Temporary Worker register
+EXPECTED_COLUMNS = ['Organisation Name', 'Town/City', 'County', 'Type & Rating', 'Route']
+
+# Routes that appear in the register. Rows on any other route are loaded but
+# reported, so a new or renamed route is reviewed and added here without
+# counting towards MAX_FAILURE_RATE and aborting the run.
+KNOWN_ROUTES = {
+    'Skilled Worker',
+    'Scale-up',
+    'Global Business Mobility: Senior or Specialist Worker',
+    'Global Business Mobility: Graduate Trainee',
+    'Global Business Mobility: UK Expansion Worker',
+    'Global Business Mobility: Service Supplier',
+    'Global Business Mobility: Secondment Worker',
+    'Intra Company Transfers (ICT)',
+    'Creative Worker',
+    'Charity Worker',
+    'Religious Worker',
+    'Minister of Religion',
+    'International Sportsperson',
+    'Government Authorised Exchange',
+    'International Agreement',
+    'Seasonal Worker',
+}
+
+# Worker types a Type & Rating value may carry, e.g. "Worker (A rating)",
+# "Temporary Worker (A rating)", "Worker (A (SME+))". Values are parsed with
+# the same grammar as the pipeline and must also have a rating.
+KNOWN_WORKER_TYPES = {'Worker', 'Temporary Worker'}
+
+# Abort the run when more than this share of rows fails validation
+MAX_FAILURE_RATE = 0.05
+
+def check_schema(df):
+    """Fail on missing columns; drop and report unexpected ones."""
+    missing = [col for col in EXPECTED_COLUMNS if col not in df.columns]
+    if missing:
+        raise Exception(f"CSV header has changed, missing columns: {', '.join(missing)}. Found: {', '.join(df.columns)}")
+
+    unexpected = [col for col in df.columns if col not in EXPECTED_COLUMNS]
+    if unexpected:
+        print(f"Ignoring unexpected columns in CSV: {', '.join(unexpected)}")
+        df = df[EXPECTED_COLUMNS]
+    return df
+
+def row_rules(df):
+    """Return (reason, failing_mask) pairs, each computed over whole columns."""
+    name = df['Organisation Name'].astype(str).str.strip()
+    route = df['Route'].astype(str).str.strip()
+    type_rating = parse_type_rating(df['Type & Rating'])
+    known_type_rating = type_rating['worker_type'].isin(KNOWN_WORKER_TYPES) & (type_rating['rating'] != '')
+
+    return [
+        ('blank organisation name', name == ''),
+        ('organisation name has no letters or digits', (name != '') & ~name.str.contains(r'[A-Za-z0-9]', regex=True)),
+        ('blank route', route == ''),
+        ('unrecognised type & rating', ~known_type_rating),
+        ('duplicate organisation and route', df.duplicated(['Organisation Name', 'Route'], keep='first')),
+    ]
+
+def report_unknown_routes(df):
+    """Print the routes outside KNOWN_ROUTES and their row counts.
+
+    Returns the counts as a Series indexed by route.
+    """
+    route = df['Route'].astype(str).str.strip()
+    unknown = route[(route != '') & ~route.isin(KNOWN_ROUTES)].value_counts()
+    if len(unknown):
+        print(f"Warning: {unknown.sum()} rows have routes not in KNOWN_ROUTES:")
+        for name, count in unknown.items():
+            print(f"  {name}: {count}")
+    return unknown
+
+def find_invalid_rows(df):
+    """Return a Series of failure reasons for every invalid row, indexed like df."""
+    reasons = pd.Series('', index=df.index, dtype=object)
+    failing = pd.Series(False, index=df.index)
+    for reason, mask in row_rules(df):
+        if mask.any():
+            previous = reasons[mask]
+            reasons[mask] = previous.where(previous == '', previous + '; ') + reason
+            failing |= mask
+    return reasons[failing]
+
+def validate_sponsor_data(df, max_failure_rate=MAX_FAILURE_RATE):
+    """Validate cleaned CSV data.
+
+    Returns (valid_rows, quarantined_rows). quarantined_rows holds the failing
+    rows with a 'reason' column. Raises if the header has changed or the
+    failure rate exceeds max_failure_rate. Unknown routes are only reported.
+    """
+    df = check_schema(df)
+    report_unknown_routes(df)
+    reasons = find_invalid_rows(df)
+
+    quarantined = df.loc[reasons.index].assign(reason=reasons)
+    valid = df.drop(index=reasons.index)
+
+    if len(quarantined):
+        print(f"Quarantined {len(quarantined)} invalid rows:")
+        for reason, count in quarantined['reason'].value_counts().items():
+            print(f"  {reason}: {count}")
+
+    failure_rate = len(quarantined) / len(df) if len(df) else 1.0
+    if failure_rate > max_failure_rate:
+        raise Exception(
+            f"Validation failed for {failure_rate:.1%} of {len(df)} rows, "
+            f"above the {max_failure_rate:.1%} threshold. Aborting update."
+        )
+
+    return valid, quarantined
+
+def save_quarantine(conn, quarantined, date):
+    """Replace the quarantine records for date with the given rows."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM quarantine WHERE date = ?", (date,))
+    cursor.executemany("""
+    INSERT INTO quarantine (date, organisation_name, town_city, county, type_rating, route, reason)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (date, row['Organisation Name'], row['Town/City'], row['County'], row['Type & Rating'], row['Route'], row['reason'])
+        for row in quarantined.to_dict(orient='records')
+    ])